@@ -0,0 +1,226 @@
+"""
+Process-wide snapshot of active events, kept current with deltas.
+
+Instead of every Streamlit session re-reading the events table, one snapshot
+per process holds the active events. It is refreshed at most once per
+FOODLENS_SYNC_INTERVAL seconds, and each refresh only asks for rows whose
+updated_at is at or past the last watermark minus FOODLENS_SYNC_OVERLAP
+seconds. updated_at is stamped by whichever app process wrote the row, so a row
+can commit after rows with later stamps (another process, a write-behind
+flush); the overlap re-reads that window so such rows are not missed until the
+next full reload. Re-read rows are merged by id, and unchanged ones are skipped.
+
+Events are indexed by (zone, diet) in lists sorted on (created_at, id), which
+each change updates in place. A page merges the lists the filters select,
+starting at the cursor, so it costs about the same whatever the table size.
+When the client offers a change
+feed (LocalClient.on_change, the stand-in for a realtime subscription), changes
+are pushed into the snapshot as they commit and polling only backs it up.
+Database reads therefore depend on the sync interval, not on how many people
+are viewing the app.
+"""
+import bisect
+import heapq
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from backend.expiry import not_expired_filter, utc_now
+from backend.supabase_client import get_client
+from backend.tracing import span
+
+# Seconds between delta pulls shared by every session in the process
+SYNC_INTERVAL = float(os.getenv("FOODLENS_SYNC_INTERVAL", "2"))
+# Seconds between full reloads that also drop rows deleted outside the app
+SYNC_FULL_RELOAD = float(os.getenv("FOODLENS_SYNC_FULL_RELOAD", "600"))
+# Seconds before the watermark that each delta re-reads, for rows stamped before they committed
+SYNC_OVERLAP = float(os.getenv("FOODLENS_SYNC_OVERLAP", "30"))
+
+
+def _order_key(event):
+    # Newest first, ties broken on id, as in fetch_events()
+    return (event.get("created_at") or "", event.get("id") or "")
+
+
+def _bucket(event):
+    return event.get("zone"), event.get("diet")
+
+
+# Keys of an ascending list below index end, newest first
+def _descending(keys, end):
+    for i in range(end - 1, -1, -1):
+        yield keys[i]
+
+
+class EventSnapshot:
+    def __init__(self, interval=SYNC_INTERVAL, full_reload=SYNC_FULL_RELOAD, overlap=SYNC_OVERLAP):
+        self.interval = interval
+        self.full_reload = full_reload
+        self.overlap = overlap
+        self._lock = threading.Lock()
+        self._events = {}
+        # (zone, diet) -> ascending list of _order_key(event)
+        self._index = {}
+        self.watermark = None
+        self.synced_at = 0.0
+        self.loaded_at = 0.0
+        self.generation = None
+        self._unsubscribe = None
+        self.stats = {"full_loads": 0, "delta_syncs": 0, "rows_pulled": 0, "rows_pushed": 0}
+
+    def __len__(self):
+        return len(self._events)
+
+    def _index_add(self, event):
+        bisect.insort(self._index.setdefault(_bucket(event), []), _order_key(event))
+
+    def _index_remove(self, event):
+        keys = self._index.get(_bucket(event), [])
+        key = _order_key(event)
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+
+    def _drop(self, event_id):
+        old = self._events.pop(event_id, None)
+        if old is not None:
+            self._index_remove(old)
+
+    def _apply(self, rows):
+        for row in rows:
+            stamp = row.get("updated_at") or row.get("created_at")
+            if stamp and (self.watermark is None or stamp > self.watermark):
+                self.watermark = stamp
+            if row.get("is_active") is False:
+                self._drop(row["id"])
+                continue
+            old = self._events.get(row["id"])
+            # Partial rows (e.g. an update payload) merge into what we already have
+            event = dict(old or {}, **row)
+            if event == old:
+                continue
+            if old is not None:
+                self._index_remove(old)
+            self._events[row["id"]] = event
+            self._index_add(event)
+
+    def _on_change(self, action, rows):
+        if action == "delete":
+            # Deleted rows have no newer updated_at; only drop them
+            with self._lock:
+                for row in rows:
+                    self._drop(row["id"])
+                self.stats["rows_pushed"] += len(rows)
+            return
+        with self._lock:
+            self._apply(rows)
+            self.stats["rows_pushed"] += len(rows)
+
+    def _load(self, client):
+        with span("event_sync.load", kind="io"):
+            rows = (
+                client.table("events").select("*").eq("is_active", True)
+                .or_(not_expired_filter()).execute().data or []
+            )
+        self._events = {}
+        self._index = {}
+        self.watermark = None
+        self._apply(rows)
+        self.loaded_at = time.monotonic()
+        self.stats["full_loads"] += 1
+        self.stats["rows_pulled"] += len(rows)
+        if self._unsubscribe is None and hasattr(client, "on_change"):
+            self._unsubscribe = client.on_change("events", self._on_change)
+
+    def _delta(self, client):
+        query = client.table("events").select("*")
+        if self.watermark is not None:
+            # Re-reading the overlap window; rows already applied merge by id unchanged
+            since = datetime.fromisoformat(self.watermark.replace("Z", "+00:00")) - timedelta(seconds=self.overlap)
+            query = query.gte("updated_at", since.isoformat())
+        with span("event_sync.delta", kind="io"):
+            rows = query.order("updated_at").execute().data or []
+        self._apply(rows)
+        self.stats["delta_syncs"] += 1
+        self.stats["rows_pulled"] += len(rows)
+
+    def sync(self, force=False):
+        """Bring the snapshot up to date if the interval passed, a local write happened, or force."""
+        from backend.events import _events_cache_generation
+
+        now = time.monotonic()
+        generation = _events_cache_generation[0]
+        if not force and generation == self.generation and now - self.synced_at < self.interval:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            generation = _events_cache_generation[0]
+            if not force and generation == self.generation and now - self.synced_at < self.interval:
+                return False
+            client = get_client()
+            if not self.loaded_at or now - self.loaded_at > self.full_reload:
+                self._load(client)
+            else:
+                # Still polled with a change feed: writes from other processes are not pushed
+                self._delta(client)
+            self.synced_at = now
+            self.generation = generation
+            return True
+
+    # Matching events newest first, from the first key below cursor; call with the lock held
+    def _iter(self, zones, diets, cursor=None):
+        streams = []
+        for (zone, diet), keys in self._index.items():
+            if (zones is None or zone in zones) and (diets is None or diet in diets):
+                end = len(keys) if cursor is None else bisect.bisect_left(keys, tuple(cursor))
+                streams.append(_descending(keys, end))
+        now = utc_now()
+        for key in heapq.merge(*streams, reverse=True):
+            event = self._events[key[1]]
+            # Expired rows stay in the snapshot until the sweeper's update arrives
+            if not event.get("expires_at") or event["expires_at"] > now:
+                yield event
+
+    def events(self, zones=None, diets=None):
+        """Active events newest first, filtered by zone/diet (copies, safe to annotate)."""
+        self.sync()
+        with self._lock:
+            return [dict(e) for e in self._iter(zones, diets)]
+
+    def page(self, zones=None, diets=None, page_size=20, cursor=None):
+        """
+        Return (rows, next_cursor) for one page of active events, newest first.
+
+        cursor is the next_cursor of the previous page (None for the first page)
+        and next_cursor is None on the last page. Cursors are (created_at, id)
+        keys, so pages stay stable while events are added.
+        """
+        self.sync()
+        with self._lock:
+            # One extra row tells whether another page follows
+            rows = [dict(e) for _, e in zip(range(page_size + 1), self._iter(zones, diets, cursor))]
+        page = rows[:page_size]
+        next_cursor = _order_key(page[-1]) if len(rows) > page_size and page else None
+        return page, next_cursor
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    global _snapshot
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = EventSnapshot()
+    return _snapshot
+
+
+def active_events(zones=None, diets=None):
+    return get_snapshot().events(zones, diets)
+
+
+def active_events_page(zones=None, diets=None, page_size=20, cursor=None):
+    return get_snapshot().page(zones, diets, page_size, cursor)
@@ -1,15 +1,143 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
 from backend.supabase_client import get_client
+from backend.notifications import notify_subscribers
+from backend.expiry import compute_expires_at, not_expired_filter, schedule_expiry
+from backend.write_behind import insert_row, on_flush
+from backend.tracing import count, span, traced
+
+# Seconds a fetch_events() result may be served from memory
+EVENTS_CACHE_TTL = float(os.getenv("FOODLENS_EVENTS_TTL", "5"))
+
+# Shared across Streamlit sessions in this process; keyed by query parameters
+_events_cache = {}
+_events_cache_lock = threading.Lock()
+# Bumped on every write so in-flight reads never repopulate the cache with stale rows
+_events_cache_generation = [0]
+
+
+def _cache_key(active, zones, diets, limit, columns):
+    zones = tuple(sorted(zones)) if zones is not None else None
+    diets = tuple(sorted(diets)) if diets is not None else None
+    return (active, zones, diets, limit, columns)
+
+
+def _cached(key, now):
+    hit = _events_cache.get(key)
+    if hit is not None and now - hit[0] < EVENTS_CACHE_TTL:
+        return hit[1]
+    return None
+
+
+def invalidate_events_cache():
+    with _events_cache_lock:
+        _events_cache.clear()
+        _events_cache_generation[0] += 1
+
+
+# Write-behind flushes land after add_event() returned, so they clear the cache too
+on_flush("events", invalidate_events_cache)
+
+
+@traced("events.fetch_events")
+def fetch_events(active=None, zones=None, diets=None, limit=None, columns="*"):
+    """
+    Return events newest first, filtered in the query rather than in Python.
+
+    active: True/False to filter on is_active, None for all events.
+    zones / diets: iterables of allowed values, None for no filter.
+    limit: maximum number of rows.
+    columns: PostgREST select list.
+    """
+    if (zones is not None and not zones) or (diets is not None and not diets):
+        return []
+
+    key = _cache_key(active, zones, diets, limit, columns)
+    now = time.monotonic()
+
+    with _events_cache_lock:
+        generation = _events_cache_generation[0]
+        rows = _cached(key, now)
+        if rows is None and (zones is not None or diets is not None):
+            # Narrowing a fresh unfiltered result instead of making another round trip
+            base = _cached(_cache_key(active, None, None, None, columns), now)
+            if base is not None:
+                rows = [
+                    e for e in base
+                    if (zones is None or e.get("zone") in zones)
+                    and (diets is None or e.get("diet") in diets)
+                ][:limit]
+    if rows is not None:
+        count("foodlens_events_cache_total", result="hit")
+        # Copying so callers can annotate rows without touching the cache
+        return [dict(e) for e in rows]
+    count("foodlens_events_cache_total", result="miss")
 
-sb = get_client()
+    query = get_client().table("events").select(columns)
+    if active is not None:
+        query = query.eq("is_active", active)
+    if active:
+        # Hiding events past their collect time even before the sweeper closes them
+        query = query.or_(not_expired_filter())
+    if zones is not None:
+        query = query.in_("zone", list(zones))
+    if diets is not None:
+        query = query.in_("diet", list(diets))
+    # id breaks created_at ties so the order is stable, as in the event snapshot
+    query = query.order("created_at", desc=True).order("id", desc=True)
+    if limit is not None:
+        query = query.limit(limit)
+    with span("events.select", kind="io"):
+        rows = query.execute().data or []
 
-def fetch_events():
-    res = sb.table("events").select("*").order("created_at", desc=True).execute()
-    return res.data or []
+    with _events_cache_lock:
+        if generation == _events_cache_generation[0]:
+            _events_cache[key] = (now, rows)
+    return [dict(e) for e in rows]
 
 
+@traced("events.add_event")
 def add_event(event_dict):
-    sb.table("events").insert(event_dict).execute()
+    """Insert an event, queue its notifications and return the stored row."""
+    # Assigning the id here so notifications can be deduped per (subscriber, event)
+    event_dict = dict(event_dict)
+    event_dict.setdefault("id", str(uuid.uuid4()))
+    # updated_at is the change-feed watermark used by backend/event_sync.py
+    now = datetime.now(timezone.utc).isoformat()
+    event_dict.setdefault("created_at", now)
+    event_dict.setdefault("updated_at", now)
+    event_dict.setdefault(
+        "expires_at",
+        compute_expires_at(event_dict.get("collect_mode"), event_dict.get("collect_until_time"), event_dict["created_at"]),
+    )
+    # Queued when write-behind is on; readers see the row once it is flushed
+    insert_row("events", event_dict)
+    schedule_expiry(event_dict["id"], event_dict["expires_at"])
+    invalidate_events_cache()
+    notify_subscribers(event_dict)
+    return event_dict
 
 
-def deactivate_event(event_id, reason=None):
-    sb.table("events").update({"is_active": False, "close_reason": reason}).eq("id", event_id).execute()
\ No newline at end of file
+def deactivate_event(event_id, reason=None, rsvps=None, attendance=None):
+    """
+    Close an event. rsvps/attendance are the real outcome, when the host knows
+    it; closed events with an attendance count feed model/refresh.py.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    values = {
+        "is_active": False,
+        "close_reason": reason,
+        "closed_at": now,
+        "updated_at": now,
+    }
+    if rsvps is not None:
+        values["rsvps"] = int(rsvps)
+    if attendance is not None:
+        values["attendance"] = int(attendance)
+    with span("events.update", kind="io"):
+        get_client().table("events").update(values).eq("id", event_id).execute()
+    invalidate_events_cache()
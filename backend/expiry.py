@@ -0,0 +1,166 @@
+"""
+Automatic deactivation of "Until specific time" events.
+
+add_event() stores an expires_at timestamp (collect_until_time on the campus
+calendar day the event was posted, rolled to the next day if that time has
+already passed). A background sweeper keeps a min-heap of (expires_at, id)
+and, once per tick, closes every event whose time has come with one bulk
+update. Reads exclude expired rows in the query itself (indexed expires_at),
+so stale events disappear even between sweeps.
+"""
+import heapq
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+# Allow importing backend/ when this file is run as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.supabase_client import get_client
+
+CAMPUS_TZ = ZoneInfo("America/Los_Angeles")
+
+# Seconds between sweeps; 0 disables the sweeper thread
+EXPIRY_TICK = float(os.getenv("FOODLENS_EXPIRY_TICK", "30"))
+# Seconds between heap rebuilds that pick up events added by other processes
+EXPIRY_RELOAD = float(os.getenv("FOODLENS_EXPIRY_RELOAD", "300"))
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def compute_expires_at(collect_mode, collect_until_time, created_at=None):
+    """UTC ISO timestamp when a time-bound event stops being collectable, else None."""
+    if collect_mode != "Until specific time" or not collect_until_time:
+        return None
+    try:
+        hour, minute = (int(v) for v in collect_until_time.split(":")[:2])
+    except ValueError:
+        return None
+    if created_at is None:
+        created = datetime.now(timezone.utc)
+    else:
+        created = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+        if created.tzinfo is None:
+            created = created.replace(tzinfo=timezone.utc)
+    local = created.astimezone(CAMPUS_TZ)
+    expires = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if expires <= local:
+        # "Until 01:00" posted in the evening means tomorrow morning
+        expires = (local + timedelta(days=1)).replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return expires.astimezone(timezone.utc).isoformat()
+
+
+def not_expired_filter(now=None):
+    """PostgREST or_ filter keeping events without expiry or not yet expired."""
+    return f'expires_at.is.null,expires_at.gt."{now or utc_now()}"'
+
+
+class ExpirySweeper:
+    def __init__(self, tick=EXPIRY_TICK, reload=EXPIRY_RELOAD):
+        self.tick = tick
+        self.reload = reload
+        self._heap = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self.loaded_at = 0.0
+        self.stats = {"sweeps": 0, "expired": 0, "updates": 0, "scheduled": 0}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, event_id, expires_at):
+        if expires_at:
+            with self._lock:
+                heapq.heappush(self._heap, (expires_at, event_id))
+                self.stats["scheduled"] += 1
+
+    def load(self):
+        rows = (
+            get_client().table("events").select("id,expires_at")
+            .eq("is_active", True).order("expires_at").execute().data or []
+        )
+        heap = [(r["expires_at"], r["id"]) for r in rows if r.get("expires_at")]
+        heapq.heapify(heap)
+        with self._lock:
+            self._heap = heap
+        self.loaded_at = time.monotonic()
+
+    def sweep(self, now=None):
+        """Close every event due by now with a single bulk update; returns their ids."""
+        if not self.loaded_at or time.monotonic() - self.loaded_at > self.reload:
+            self.load()
+        now = now or utc_now()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[1])
+        self.stats["sweeps"] += 1
+        if not due:
+            return []
+
+        due = list(dict.fromkeys(due))
+        (
+            get_client().table("events")
+            .update({"is_active": False, "close_reason": "expired", "closed_at": now, "updated_at": now})
+            .in_("id", due)
+            .eq("is_active", True)
+            .execute()
+        )
+        from backend.events import invalidate_events_cache
+
+        invalidate_events_cache()
+        self.stats["expired"] += len(due)
+        self.stats["updates"] += 1
+        return due
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                # Expired rows are still hidden by the read filter; retry next tick
+                print(f"Expiry sweep failed: {e}", file=sys.stderr)
+            time.sleep(self.tick)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="foodlens-expiry", daemon=True)
+                self._thread.start()
+        return self._thread
+
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def get_sweeper():
+    global _sweeper
+    if _sweeper is None:
+        with _sweeper_lock:
+            if _sweeper is None:
+                _sweeper = ExpirySweeper()
+    return _sweeper
+
+
+def schedule_expiry(event_id, expires_at):
+    # Only a running sweeper keeps a heap; others pick the row up on their next load
+    if _sweeper is not None and expires_at:
+        _sweeper.schedule(event_id, expires_at)
+
+
+def start_sweeper(tick=EXPIRY_TICK):
+    """Start the sweeper thread for this process (no-op when tick <= 0)."""
+    if tick <= 0:
+        return None
+    return get_sweeper().start()
+
+
+if __name__ == "__main__":
+    expired = get_sweeper().sweep()
+    print(f"Expired {len(expired)} events")
@@ -0,0 +1,182 @@
+"""
+Event image ingestion: downsize, re-encode, thumbnail, store once.
+
+Uploads are named by the SHA-256 of their original bytes, so the same flyer
+posted twice maps to the same object and is only processed and stored once.
+Each image is stored as a JPEG capped at FOODLENS_IMAGE_MAX_SIDE pixels
+(<hash>.jpg) plus a FOODLENS_IMAGE_THUMB_SIDE thumbnail (<hash>_thumb.jpg).
+The public URL is known from the hash alone, so add_event() can save it right
+away while resizing and uploading happen on a background thread. The upload is
+checked to be a readable image on the request thread first, so bad files are
+rejected before any event points at them. If storing still fails, the error is
+logged and counted, and events pointing at the missing object (stored or still
+queued for write-behind) get their image_url cleared.
+"""
+import hashlib
+import io
+import os
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.supabase_client import get_client
+
+BUCKET = "event-images"
+
+IMAGE_MAX_SIDE = int(os.getenv("FOODLENS_IMAGE_MAX_SIDE", "1280"))
+IMAGE_THUMB_SIDE = int(os.getenv("FOODLENS_IMAGE_THUMB_SIDE", "320"))
+IMAGE_QUALITY = int(os.getenv("FOODLENS_IMAGE_QUALITY", "82"))
+IMAGE_WORKERS = int(os.getenv("FOODLENS_IMAGE_WORKERS", "2"))
+
+_HASHED_NAME = re.compile(r"([0-9a-f]{32})\.jpg$")
+
+_executor = None
+_executor_lock = threading.Lock()
+# Object names stored (or being stored) by this process
+_stored = {}
+_stored_lock = threading.Lock()
+_stats = {"stored": 0, "failed": 0, "last_error": None}
+
+
+def _encode(img, side):
+    from PIL import Image
+
+    img = img.copy()
+    img.thumbnail((side, side), Image.LANCZOS)
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=IMAGE_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def process_image(data):
+    """Return (full, thumbnail) JPEG bytes for an uploaded image, EXIF stripped."""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as img:
+        # Applying camera rotation before the EXIF block is dropped
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        return _encode(img, IMAGE_MAX_SIDE), _encode(img, IMAGE_THUMB_SIDE)
+
+
+def validate_image(data):
+    """Raise ValueError unless data is an image Pillow can read (header and structure only, no decode)."""
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.verify()
+    except Exception as e:
+        raise ValueError(f"not a readable image: {e}") from e
+
+
+def image_name(data):
+    return hashlib.sha256(data).hexdigest()[:32] + ".jpg"
+
+
+def thumbnail_url(url):
+    """Thumbnail for a hashed image URL; other (legacy) URLs are returned unchanged."""
+    if url and _HASHED_NAME.search(url):
+        return url[:-4] + "_thumb.jpg"
+    return url
+
+
+def public_url(name):
+    sb = get_client()
+    base = sb.storage.from_(BUCKET).get_public_url(name)
+    if base.startswith("http") or sb.supabase_url == "local":
+        return base
+    return f"{sb.supabase_url}/storage/v1/object/public/{BUCKET}/{name}"
+
+
+def _upload(bucket, name, data):
+    try:
+        bucket.upload(name, data, file_options={"content-type": "image/jpeg", "cache-control": "31536000"})
+    except Exception as e:
+        # Content-addressed: an existing object already holds these exact bytes
+        if "duplicate" not in str(e).lower() and "already exists" not in str(e).lower():
+            raise
+
+
+def _store(name, data):
+    full, thumb = process_image(data)
+    bucket = get_client().storage.from_(BUCKET)
+    _upload(bucket, name[:-4] + "_thumb.jpg", thumb)
+    _upload(bucket, name, full)
+    return len(data), len(full), len(thumb)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="foodlens-images")
+    return _executor
+
+
+def clear_image_url(url):
+    """Remove a failed upload's URL from the events that reference it, flushed or not."""
+    from backend.events import invalidate_events_cache
+    from backend.write_behind import update_pending
+
+    # Queued inserts first: this waits out a flush in progress, so the update below lands after it
+    update_pending("events", "image_url", url, {"image_url": None})
+    now = datetime.now(timezone.utc).isoformat()
+    get_client().table("events").update({"image_url": None, "updated_at": now}).eq("image_url", url).execute()
+    invalidate_events_cache()
+
+
+def _on_stored(name, future):
+    error = future.exception()
+    with _stored_lock:
+        if error is None:
+            _stats["stored"] += 1
+            return
+        _stats["failed"] += 1
+        _stats["last_error"] = str(error)
+    print(f"Image upload failed for {name}: {error}", file=sys.stderr)
+    try:
+        clear_image_url(public_url(name))
+    except Exception as e:
+        print(f"Could not clear image_url for {name}: {e}", file=sys.stderr)
+
+
+def image_stats():
+    with _stored_lock:
+        return dict(_stats)
+
+
+def ingest_image(data):
+    """
+    Queue an uploaded image for resizing and storage; return (public_url, future).
+
+    Raises ValueError for files that are not readable images. The future
+    resolves to (original_bytes, stored_bytes, thumbnail_bytes) once both
+    objects are uploaded, or to the first upload of the same content.
+    """
+    name = image_name(data)
+    with _stored_lock:
+        future = _stored.get(name)
+        submitted = future is None or (future.done() and future.exception() is not None)
+    if submitted:
+        validate_image(data)
+        with _stored_lock:
+            future = _stored.get(name)
+            if future is None or (future.done() and future.exception() is not None):
+                future = _get_executor().submit(_store, name, data)
+                _stored[name] = future
+            else:
+                submitted = False
+    if submitted:
+        # Outside the lock: a future that already finished runs the callback inline, and it takes the lock
+        future.add_done_callback(lambda f: _on_stored(name, f))
+    return public_url(name), future
@@ -0,0 +1,434 @@
+"""
+In-process stand-in for the hosted Supabase backend.
+
+LocalClient implements the slice of the supabase-py API that FoodLens uses
+(table().select/insert/update with eq/in_/order/limit filters, and
+storage.from_().upload/get_public_url) on top of SQLite, so the app, the smoke
+tests and load tests can run without network access. Select it with
+FOODLENS_BACKEND=sqlite (file at FOODLENS_SQLITE_PATH) or FOODLENS_BACKEND=memory.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+# Declared columns per table; unknown columns are added on first insert
+TABLES = {
+    "events": {
+        "id": "text",
+        "building": "text",
+        "zone": "text",
+        "event_type": "text",
+        "diet": "text",
+        "food_desc": "text",
+        "collect_mode": "text",
+        "collect_until_time": "text",
+        "image_url": "text",
+        "is_active": "bool",
+        "close_reason": "text",
+        "closed_at": "text",
+        "updated_at": "text",
+        "expires_at": "text",
+        "rsvps": "int",
+        "attendance": "int",
+        "created_at": "text",
+    },
+    "subscribers": {
+        "id": "text",
+        "username": "text",
+        "email": "text",
+        "zones": "json",
+        "diets": "json",
+        "created_at": "text",
+    },
+    "feedback": {
+        "id": "text",
+        "name": "text",
+        "email": "text",
+        "message": "text",
+        "created_at": "text",
+    },
+}
+
+# Mirroring the indexes the browse queries rely on in Postgres
+INDEXES = {
+    "events": ["is_active", "zone", "diet", "created_at", "closed_at", "updated_at", "expires_at"],
+    "subscribers": ["created_at"],
+}
+
+_SQL_TYPES = {"text": "TEXT", "bool": "INTEGER", "json": "TEXT", "int": "INTEGER", "real": "REAL"}
+
+
+def _q(name):
+    return '"' + name.strip() + '"'
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _infer_type(value):
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "real"
+    if isinstance(value, (list, dict)):
+        return "json"
+    return "text"
+
+
+class LocalQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self._action = "select"
+        self._columns = "*"
+        self._values = None
+        self._where = []
+        self._params = []
+        self._order = []
+        self._limit = None
+
+    def select(self, columns="*"):
+        self._action = "select"
+        self._columns = columns
+        return self
+
+    def insert(self, rows):
+        self._action = "insert"
+        self._values = rows if isinstance(rows, list) else [rows]
+        self._conflict = "ABORT"
+        return self
+
+    def upsert(self, rows, ignore_duplicates=False, on_conflict="id"):
+        # Conflicts are resolved on the primary key (id), which is all the app uses
+        self.insert(rows)
+        self._conflict = "IGNORE" if ignore_duplicates else "REPLACE"
+        return self
+
+    def update(self, values):
+        self._action = "update"
+        self._values = values
+        return self
+
+    def delete(self):
+        self._action = "delete"
+        return self
+
+    def _filter(self, column, op, value):
+        self._where.append(f'"{column}" {op} ?')
+        self._params.append(self.client._to_sql(self.table, column, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "=", value)
+
+    def neq(self, column, value):
+        return self._filter(column, "!=", value)
+
+    def gt(self, column, value):
+        return self._filter(column, ">", value)
+
+    def gte(self, column, value):
+        return self._filter(column, ">=", value)
+
+    def lt(self, column, value):
+        return self._filter(column, "<", value)
+
+    def lte(self, column, value):
+        return self._filter(column, "<=", value)
+
+    def is_(self, column, value):
+        if value in (None, "null"):
+            self._where.append(f'"{column}" IS NULL')
+            return self
+        return self.eq(column, value)
+
+    def in_(self, column, values):
+        values = list(values)
+        if not values:
+            self._where.append("0")
+            return self
+        self._where.append(f'"{column}" IN ({", ".join("?" * len(values))})')
+        self._params += [self.client._to_sql(self.table, column, v) for v in values]
+        return self
+
+    def or_(self, filters):
+        """PostgREST logic tree, e.g. 'created_at.lt.X,and(created_at.eq.X,id.lt.Y)'."""
+        sql, params = self._logic(filters, " OR ")
+        self._where.append(sql)
+        self._params += params
+        return self
+
+    _OPS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+    def _logic(self, text, joiner):
+        parts, params = [], []
+        for term in _split_terms(text):
+            for group, inner_joiner in (("and(", " AND "), ("or(", " OR ")):
+                if term.startswith(group) and term.endswith(")"):
+                    sql, p = self._logic(term[len(group):-1], inner_joiner)
+                    parts.append(f"({sql})")
+                    params += p
+                    break
+            else:
+                column, op, value = term.split(".", 2)
+                if value.startswith('"') and value.endswith('"'):
+                    value = value[1:-1]
+                if op == "is":
+                    parts.append(f'"{column}" IS NULL' if value == "null" else f'"{column}" = ?')
+                    if value != "null":
+                        params.append(self.client._to_sql(self.table, column, {"true": True, "false": False}[value]))
+                    continue
+                parts.append(f'"{column}" {self._OPS[op]} ?')
+                params.append(self.client._to_sql(self.table, column, value))
+        return "(" + joiner.join(parts) + ")", params
+
+    def order(self, column, desc=False):
+        self._order.append(f'"{column}" {"DESC" if desc else "ASC"}')
+        return self
+
+    def limit(self, n):
+        self._limit = int(n)
+        return self
+
+    def execute(self):
+        rows = self.client._execute(self)
+        if self._action != "select" and rows:
+            self.client._emit(self.table, self._action, rows)
+        return SimpleNamespace(data=rows)
+
+
+# Splitting a PostgREST filter list on top-level commas (not inside quotes or parentheses)
+def _split_terms(text):
+    terms, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(text):
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            terms.append(text[start:i])
+            start = i + 1
+    terms.append(text[start:])
+    return [t.strip() for t in terms if t.strip()]
+
+
+class LocalBucket:
+    def __init__(self, root, bucket):
+        self.dir = os.path.join(root, bucket)
+
+    def upload(self, path, file, file_options=None):
+        target = os.path.join(self.dir, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(file)
+        return SimpleNamespace(path=path)
+
+    def get_public_url(self, path):
+        return os.path.join(self.dir, path)
+
+
+class LocalStorage:
+    def __init__(self, root):
+        self.root = root
+
+    def from_(self, bucket):
+        return LocalBucket(self.root, bucket)
+
+
+class LocalClient:
+    def __init__(self, path=":memory:", storage_root="event_images"):
+        self.path = path
+        self.supabase_url = "local"
+        self.storage = LocalStorage(storage_root)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._types = {}
+        self._listeners = {}
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock:
+            for table, columns in TABLES.items():
+                cols = ", ".join(
+                    f'"{c}" {_SQL_TYPES[t]}' + (" PRIMARY KEY" if c == "id" else "")
+                    for c, t in columns.items()
+                )
+                self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({cols})')
+                for col in INDEXES.get(table, []):
+                    self._conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{col}" ON "{table}" ("{col}")')
+                self._load_types(table)
+            self._conn.commit()
+
+    def _load_types(self, table):
+        declared = TABLES.get(table, {})
+        types = {}
+        for row in self._conn.execute(f'PRAGMA table_info("{table}")'):
+            name = row["name"]
+            types[name] = declared.get(name) or {"INTEGER": "int", "REAL": "real"}.get(row["type"], "text")
+        self._types[table] = types
+
+    def _ensure_columns(self, table, row):
+        if table not in self._types:
+            self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ("id" TEXT PRIMARY KEY, "created_at" TEXT)')
+            self._load_types(table)
+        for col, value in row.items():
+            if col not in self._types[table]:
+                t = _infer_type(value) if value is not None else "text"
+                self._conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{col}" {_SQL_TYPES[t]}')
+                self._types[table][col] = t
+
+    def _to_sql(self, table, column, value):
+        t = self._types.get(table, {}).get(column)
+        if value is None:
+            return None
+        if t == "json" or isinstance(value, (list, dict)):
+            return json.dumps(value)
+        if isinstance(value, bool):
+            return int(value)
+        return value
+
+    def _from_sql(self, table, row):
+        types = self._types[table]
+        out = {}
+        for col in row.keys():
+            value = row[col]
+            t = types.get(col)
+            if value is not None and t == "bool":
+                value = bool(value)
+            elif value is not None and t == "json":
+                value = json.loads(value)
+            out[col] = value
+        return out
+
+    def table(self, name):
+        return LocalQuery(self, name)
+
+    def on_change(self, table, callback):
+        """
+        Stand-in for a realtime subscription: callback(action, rows) runs after
+        every committed insert/update/delete on table. Returns an unsubscribe function.
+        """
+        with self._lock:
+            self._listeners.setdefault(table, []).append(callback)
+        return lambda: self._listeners.get(table, []).remove(callback)
+
+    def _emit(self, table, action, rows):
+        for callback in list(self._listeners.get(table, [])):
+            callback(action, [dict(r) for r in rows])
+
+    def _select_sql(self, q, where):
+        columns = "*" if q._columns.strip() == "*" else ", ".join(_q(c) for c in q._columns.split(","))
+        sql = f'SELECT {columns} FROM "{q.table}"'
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if q._order:
+            sql += " ORDER BY " + ", ".join(q._order)
+        if q._limit is not None:
+            sql += f" LIMIT {q._limit}"
+        return sql
+
+    def _execute(self, q):
+        with self._lock:
+            if q.table not in self._types:
+                self._ensure_columns(q.table, {})
+
+            if q._action == "insert":
+                rows = []
+                for values in q._values:
+                    row = dict(values)
+                    row.setdefault("id", str(uuid.uuid4()))
+                    row.setdefault("created_at", _now())
+                    if q.table == "events":
+                        row.setdefault("is_active", True)
+                    self._ensure_columns(q.table, row)
+                    cols = list(row)
+                    cur = self._conn.execute(
+                        f'INSERT OR {q._conflict} INTO "{q.table}" ({", ".join(_q(c) for c in cols)}) '
+                        f'VALUES ({", ".join("?" * len(cols))})',
+                        [self._to_sql(q.table, c, row[c]) for c in cols],
+                    )
+                    # Ignored duplicates are not returned, as with PostgREST's ON CONFLICT DO NOTHING
+                    if cur.rowcount:
+                        rows.append(row)
+                self._conn.commit()
+                return rows
+
+            where = " AND ".join(q._where)
+            if q._action == "update":
+                self._ensure_columns(q.table, q._values)
+                ids = [r["id"] for r in self._conn.execute(
+                    f'SELECT "id" FROM "{q.table}"' + (f" WHERE {where}" if where else ""), q._params)]
+                if ids:
+                    cols = list(q._values)
+                    self._conn.execute(
+                        f'UPDATE "{q.table}" SET {", ".join(_q(c) + " = ?" for c in cols)} '
+                        f'WHERE "id" IN ({", ".join("?" * len(ids))})',
+                        [self._to_sql(q.table, c, q._values[c]) for c in cols] + ids,
+                    )
+                    self._conn.commit()
+                cur = self._conn.execute(
+                    f'SELECT * FROM "{q.table}" WHERE "id" IN ({", ".join("?" * len(ids))})', ids) if ids else []
+                return [self._from_sql(q.table, r) for r in cur]
+
+            if q._action == "delete":
+                cur = self._conn.execute(f'SELECT * FROM "{q.table}"' + (f" WHERE {where}" if where else ""), q._params)
+                rows = [self._from_sql(q.table, r) for r in cur]
+                self._conn.execute(f'DELETE FROM "{q.table}"' + (f" WHERE {where}" if where else ""), q._params)
+                self._conn.commit()
+                return rows
+
+            cur = self._conn.execute(self._select_sql(q, q._where), q._params)
+            return [self._from_sql(q.table, r) for r in cur]
+
+
+# Filling the events table with synthetic rows for load tests
+def seed_events(client, n, seed=42, active_ratio=0.3):
+    buildings = ["Boelter Hall", "Math Sciences", "Engineering VI", "Royce Hall", "Haines Hall", "Kaplan Hall",
+                 "Anderson", "UCLA Law", "Gonda", "Pauley Pavilion", "Hedrick Hall", "Sproul Hall"]
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    rows = []
+    for i in range(n):
+        mode = rng.choice(["Until supplies last", "Until specific time"])
+        rows.append({
+            "building": rng.choice(buildings),
+            "zone": rng.choice(["north", "south", "east", "west"]),
+            "event_type": rng.choice(["club", "seminar", "fair", "career_fair"]),
+            "diet": rng.choice(["vegan", "vegetarian", "non-vegetarian", "mixed"]),
+            "food_desc": rng.choice(["pizza", "sandwiches", "burritos", "cookies", "boba"]),
+            "collect_mode": mode,
+            "collect_until_time": f"{rng.randint(9, 21):02d}:{rng.choice([0, 30]):02d}" if mode == "Until specific time" else "",
+            "image_url": None,
+            "is_active": rng.random() < active_ratio,
+            "created_at": (start + timedelta(seconds=i * 365 * 86400 / max(n, 1))).isoformat(),
+        })
+        rows[-1]["updated_at"] = rows[-1]["created_at"]
+    for i in range(0, n, 1000):
+        client.table("events").insert(rows[i:i + 1000]).execute()
+    return n
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Create and seed a local FoodLens SQLite database.")
+    parser.add_argument("--db", default="foodlens.db")
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    seed_events(LocalClient(args.db), args.events, seed=args.seed)
+    print(f"WROTE: {args.db} ({args.events} events)")
@@ -0,0 +1,94 @@
+"""
+Delivery transports for subscriber notifications.
+
+Every transport takes a batch of messages (dicts with to/subject/body) and
+returns {index: error} for the messages it could not deliver (empty when all
+went out). Raising means none were delivered. The dispatcher retries only the
+failed messages, so accepted recipients are never emailed twice.
+Pick one with FOODLENS_NOTIFY_TRANSPORT:
+
+    file  - append JSON lines to FOODLENS_NOTIFY_FILE (default, no network)
+    smtp  - send through FOODLENS_SMTP_HOST:FOODLENS_SMTP_PORT; point it at a
+            local debugging server (`python -m aiosmtpd -n -l localhost:1025`)
+            to measure throughput without a real mail provider
+    none  - drop messages (load tests of the queue itself)
+"""
+import json
+import os
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+
+class FileTransport:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, messages):
+        lines = "".join(json.dumps(dict(m, sent_at=time.time())) + "\n" for m in messages)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(lines)
+        return {}
+
+
+class SMTPTransport:
+    def __init__(self, host="localhost", port=1025, sender="foodlens@localhost",
+                 username=None, password=None, starttls=False, timeout=10):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def send(self, messages):
+        # One SMTP session per batch instead of one per recipient
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            failed = {}
+            for i, m in enumerate(messages):
+                msg = EmailMessage()
+                msg["From"] = self.sender
+                msg["To"] = m["to"]
+                msg["Subject"] = m["subject"]
+                msg.set_content(m["body"])
+                try:
+                    smtp.send_message(msg)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                    # Rejected by the server for this message only; the session is still usable
+                    failed[i] = e
+                except (smtplib.SMTPException, OSError) as e:
+                    # Connection lost: this and every later message were not accepted
+                    failed.update((j, e) for j in range(i, len(messages)))
+                    break
+            return failed
+
+
+class NullTransport:
+    def send(self, messages):
+        return {}
+
+
+def get_transport():
+    kind = os.getenv("FOODLENS_NOTIFY_TRANSPORT", "file").lower()
+    if kind == "file":
+        return FileTransport(os.getenv("FOODLENS_NOTIFY_FILE", "notifications.jsonl"))
+    if kind == "smtp":
+        return SMTPTransport(
+            host=os.getenv("FOODLENS_SMTP_HOST", "localhost"),
+            port=int(os.getenv("FOODLENS_SMTP_PORT", "1025")),
+            sender=os.getenv("FOODLENS_SMTP_SENDER", "foodlens@localhost"),
+            username=os.getenv("FOODLENS_SMTP_USER") or None,
+            password=os.getenv("FOODLENS_SMTP_PASSWORD") or None,
+            starttls=os.getenv("FOODLENS_SMTP_STARTTLS", "0") == "1",
+        )
+    if kind == "none":
+        return NullTransport()
+    raise ValueError(f"Unknown FOODLENS_NOTIFY_TRANSPORT: {kind!r} (expected file, smtp or none).")
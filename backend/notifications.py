@@ -0,0 +1,306 @@
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict, defaultdict, deque
+
+from backend.supabase_client import get_client
+
+# Seconds between incremental pulls of subscribers added by other processes
+SUBSCRIBER_REFRESH = float(os.getenv("FOODLENS_SUBSCRIBER_REFRESH", "300"))
+
+# Dispatch tuning: recipients per send, sustained messages per second, attempts per batch
+NOTIFY_BATCH_SIZE = int(os.getenv("FOODLENS_NOTIFY_BATCH_SIZE", "50"))
+NOTIFY_RATE = float(os.getenv("FOODLENS_NOTIFY_RATE", "100"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("FOODLENS_NOTIFY_MAX_ATTEMPTS", "4"))
+NOTIFY_WORKERS = int(os.getenv("FOODLENS_NOTIFY_WORKERS", "2"))
+
+_EMPTY = frozenset()
+
+
+class SubscriberIndex:
+    """Inverted index from zone and diet to subscriber IDs for event fan-out."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_zone = defaultdict(set)
+        self._by_diet = defaultdict(set)
+        self._subscribers = {}
+        self.watermark = None
+        self.refreshed_at = 0.0
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def add(self, subscriber):
+        sub_id = subscriber["id"]
+        with self._lock:
+            if sub_id in self._subscribers:
+                self._discard(sub_id)
+            self._subscribers[sub_id] = subscriber
+            for zone in subscriber.get("zones") or []:
+                self._by_zone[zone].add(sub_id)
+            for diet in subscriber.get("diets") or []:
+                self._by_diet[diet].add(sub_id)
+            created = subscriber.get("created_at")
+            if created and (self.watermark is None or created > self.watermark):
+                self.watermark = created
+
+    def remove(self, sub_id):
+        with self._lock:
+            self._discard(sub_id)
+
+    def _discard(self, sub_id):
+        subscriber = self._subscribers.pop(sub_id, None)
+        if subscriber is None:
+            return
+        for zone in subscriber.get("zones") or []:
+            self._by_zone[zone].discard(sub_id)
+        for diet in subscriber.get("diets") or []:
+            self._by_diet[diet].discard(sub_id)
+
+    def match_ids(self, zone, diet):
+        # set & set iterates over the smaller posting list
+        with self._lock:
+            return self._by_zone.get(zone, _EMPTY) & self._by_diet.get(diet, _EMPTY)
+
+    def match(self, event):
+        ids = self.match_ids(event.get("zone"), event.get("diet"))
+        with self._lock:
+            return [self._subscribers[i] for i in ids if i in self._subscribers]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+_SUBSCRIBER_COLUMNS = "id,username,email,zones,diets,created_at"
+
+
+# Pulling subscribers newer than the index watermark (all of them on first call)
+def _refresh(index):
+    query = get_client().table("subscribers").select(_SUBSCRIBER_COLUMNS)
+    if index.watermark is not None:
+        query = query.gt("created_at", index.watermark)
+    for row in query.order("created_at").execute().data or []:
+        index.add(row)
+    index.refreshed_at = time.monotonic()
+
+
+def get_subscriber_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = SubscriberIndex()
+                _refresh(index)
+                _index = index
+    elif time.monotonic() - _index.refreshed_at > SUBSCRIBER_REFRESH:
+        with _index_lock:
+            if time.monotonic() - _index.refreshed_at > SUBSCRIBER_REFRESH:
+                _refresh(_index)
+    return _index
+
+
+# Keeping an already-built index current without a reload
+def index_subscriber(subscriber):
+    if _index is not None:
+        _index.add(subscriber)
+
+
+def match_subscribers(event):
+    return get_subscriber_index().match(event)
+
+
+class _RateLimiter:
+    """Token bucket shared by all dispatch workers."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n=1):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                # Batches larger than the bucket are allowed once it is full
+                need = min(n, self.capacity)
+                if self.tokens >= need:
+                    self.tokens -= n
+                    return
+                wait = (need - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _format_message(subscriber, event):
+    where = event.get("building", "campus")
+    until = event.get("collect_until_time") or ""
+    return {
+        "to": subscriber["email"],
+        "subscriber_id": subscriber["id"],
+        "event_id": event.get("id"),
+        "subject": f"Free food at {where}: {event.get('food_desc') or 'food'}",
+        "body": (
+            f"Hi {subscriber.get('username') or 'there'},\n\n"
+            f"{event.get('food_desc') or 'Free food'} ({event.get('diet')}) is available at {where} "
+            f"({event.get('zone')} campus). Collect: {event.get('collect_mode', '')} {until}\n"
+        ),
+    }
+
+
+class NotificationDispatcher:
+    """Background queue that fans event notifications out in rate-limited, retried batches."""
+
+    def __init__(self, transport=None, batch_size=NOTIFY_BATCH_SIZE, rate=NOTIFY_RATE,
+                 max_attempts=NOTIFY_MAX_ATTEMPTS, workers=NOTIFY_WORKERS, dedupe_size=100000):
+        self.transport = transport
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.limiter = _RateLimiter(rate)
+        self._queue = queue.Queue()
+        self._workers = workers
+        self._threads = []
+        self._lock = threading.Lock()
+        # (subscriber_id, event_id) pairs already queued or delivered
+        self._seen = OrderedDict()
+        self._dedupe_size = dedupe_size
+        self.stats = {"events": 0, "enqueued": 0, "deduped": 0, "sent": 0, "failed": 0, "retries": 0, "batches": 0,
+                      "errors": 0}
+        self.latencies = deque(maxlen=4096)
+
+    def _start(self):
+        if self.transport is None:
+            from backend.mail_transport import get_transport
+
+            self.transport = get_transport()
+        for i in range(self._workers):
+            t = threading.Thread(target=self._run, name=f"foodlens-notify-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, event):
+        """Queue an event for subscriber matching and delivery on the workers; return immediately."""
+        with self._lock:
+            if not self._threads:
+                self._start()
+            self.stats["events"] += 1
+        # A batch of None asks a worker to resolve the recipients first
+        self._queue.put((event, None, time.monotonic()))
+
+    def enqueue(self, event, recipients, enqueued_at=None):
+        """Queue one message per new (subscriber, event) pair and return immediately."""
+        event_id = event.get("id")
+        fresh = []
+        with self._lock:
+            if not self._threads:
+                self._start()
+            for sub in recipients:
+                key = (sub["id"], event_id)
+                if key in self._seen:
+                    self.stats["deduped"] += 1
+                    continue
+                self._seen[key] = True
+                if len(self._seen) > self._dedupe_size:
+                    self._seen.popitem(last=False)
+                fresh.append(sub)
+            self.stats["enqueued"] += len(fresh)
+
+        now = time.monotonic() if enqueued_at is None else enqueued_at
+        for i in range(0, len(fresh), self.batch_size):
+            self._queue.put((event, fresh[i:i + self.batch_size], now))
+        return len(fresh)
+
+    def _run(self):
+        while True:
+            event, batch, enqueued_at = self._queue.get()
+            try:
+                if batch is None:
+                    # Index build/refresh and matching happen here, off the request thread
+                    recipients = match_subscribers(event)
+                    if recipients:
+                        self.enqueue(event, recipients, enqueued_at)
+                else:
+                    self._deliver(event, batch, enqueued_at)
+            except Exception:
+                # One bad event or subscriber row must not take the worker down
+                with self._lock:
+                    self.stats["errors"] += 1
+                print(f"Notification job for event {event.get('id')} failed:", file=sys.stderr)
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, event, batch, enqueued_at):
+        pending = [_format_message(sub, event) for sub in batch]
+        self.limiter.acquire(len(pending))
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                failed = self.transport.send(pending) or {}
+            except Exception as e:
+                failed = {i: e for i in range(len(pending))}
+            with self._lock:
+                self.stats["sent"] += len(pending) - len(failed)
+            # Retrying only the messages that were not accepted
+            pending = [pending[i] for i in sorted(failed)]
+            if not pending:
+                break
+            if attempt == self.max_attempts:
+                with self._lock:
+                    self.stats["failed"] += len(pending)
+                return
+            with self._lock:
+                self.stats["retries"] += 1
+            # Exponential backoff with jitter: ~0.5s, 1s, 2s, ...
+            time.sleep(0.5 * 2 ** (attempt - 1) * (0.5 + random.random()))
+        with self._lock:
+            self.stats["batches"] += 1
+            self.latencies.append(time.monotonic() - enqueued_at)
+
+    def flush(self, timeout=None):
+        """Block until every queued batch has been delivered or dropped (for tests/benchmarks)."""
+        if timeout is None:
+            self._queue.join()
+            return True
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            latencies = sorted(self.latencies)
+        stats["queue_depth"] = self._queue.qsize()
+        for name, q in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            stats[f"latency_ms_{name}"] = (
+                latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else None
+            )
+        return stats
+
+
+_dispatcher = None
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _index_lock:
+            if _dispatcher is None:
+                _dispatcher = NotificationDispatcher()
+    return _dispatcher
+
+
+def notify_subscribers(event):
+    """Queue the event's notifications; matching and delivery run on the dispatcher workers."""
+    get_dispatcher().submit(event)
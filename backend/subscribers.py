@@ -1,11 +1,18 @@
-from backend.supabase_client import get_client
+import uuid
+from datetime import datetime, timezone
 
-sb = get_client()
+from backend.notifications import index_subscriber
+from backend.write_behind import insert_row
 
 def add_subscriber(username, email, zones, diets):
-    sb.table("subscribers").insert({
+    subscriber = {
+        "id": str(uuid.uuid4()),
         "username": username,
         "email": email,
         "zones": zones,
-        "diets": diets
-    }).execute()
+        "diets": diets,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    insert_row("subscribers", subscriber)
+    index_subscriber(subscriber)
+    return subscriber
@@ -1,21 +1,27 @@
 import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING
 
-from dotenv import load_dotenv
-from supabase import create_client, Client
+if TYPE_CHECKING:
+    from supabase import Client
 
-try:
-    import streamlit as st
-except ImportError:
-    st = None
-
-load_dotenv()
+# supabase, httpx and dotenv are imported on first get_client() call so that
+# importing backend modules stays cheap and never needs credentials.
 
 
 def _get_supabase_credentials():
-    # Try Streamlit secrets first (cloud)
+    # Try Streamlit secrets first (cloud); only when the app already imported Streamlit
+    st = sys.modules.get("streamlit")
     if st is not None and hasattr(st, "secrets"):
-        url = st.secrets.get("SUPABASE_URL")
-        key = st.secrets.get("SUPABASE_KEY")
+        try:
+            url = st.secrets.get("SUPABASE_URL")
+            key = st.secrets.get("SUPABASE_KEY")
+        except Exception:
+            # No secrets.toml outside Streamlit Cloud
+            url = key = None
         if url and key:
             return url, key
 
@@ -25,11 +31,128 @@ def _get_supabase_credentials():
     return url, key
 
 
-SUPABASE_URL, SUPABASE_KEY = _get_supabase_credentials()
+def _load_settings():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return {
+        # Storage backend: "supabase" (hosted), "sqlite" (local file) or "memory" (throwaway SQLite)
+        "backend": os.getenv("FOODLENS_BACKEND", "supabase").lower(),
+        "sqlite_path": os.getenv("FOODLENS_SQLITE_PATH", "foodlens.db"),
+        # Connection pool and timeout settings for the shared HTTP transport
+        "pool_size": int(os.getenv("FOODLENS_HTTP_POOL_SIZE", "20")),
+        "timeout": float(os.getenv("FOODLENS_HTTP_TIMEOUT", "10")),
+        "connect_timeout": float(os.getenv("FOODLENS_HTTP_CONNECT_TIMEOUT", "5")),
+    }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class _HttpStats:
+    """Counting requests, connection reuse and latency on the shared transport."""
+
+    def __init__(self, window=1024):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.latencies = deque(maxlen=window)
+        self._started = {}
+        self._streams = set()
+
+    def on_request(self, request):
+        with self.lock:
+            # Requests that fail before a response never pop their entry
+            if len(self._started) > 10000:
+                self._started.clear()
+            self._started[id(request)] = time.perf_counter()
+
+    def on_response(self, response):
+        now = time.perf_counter()
+        # Each pooled connection keeps one network stream, so an unseen stream means a new connection
+        stream = response.extensions.get("network_stream")
+        with self.lock:
+            started = self._started.pop(id(response.request), None)
+            self.requests += 1
+            if started is not None:
+                self.latencies.append(now - started)
+            if stream is not None and id(stream) not in self._streams:
+                self.new_connections += 1
+                if len(self._streams) > 10000:
+                    self._streams.clear()
+                self._streams.add(id(stream))
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            requests = self.requests
+            new_connections = self.new_connections
+        pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else None
+        return {
+            "requests": requests,
+            "new_connections": new_connections,
+            "reuse_rate": (1 - new_connections / requests) if requests else None,
+            "latency_ms_avg": (sum(latencies) / len(latencies) * 1000) if latencies else None,
+            "latency_ms_p50": pct(0.50),
+            "latency_ms_p95": pct(0.95),
+        }
+
+
+http_stats = _HttpStats()
+
+
+def _build_http_client(settings):
+    import httpx
+
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=settings["pool_size"],
+            max_keepalive_connections=settings["pool_size"],
+        ),
+        timeout=httpx.Timeout(settings["timeout"], connect=settings["connect_timeout"]),
+        event_hooks={"request": [http_stats.on_request], "response": [http_stats.on_response]},
+    )
+
+
+def _create_client():
+    settings = _load_settings()
+    backend = settings["backend"]
+    if backend in ("sqlite", "memory"):
+        from backend.local_client import LocalClient
+
+        return LocalClient(settings["sqlite_path"] if backend == "sqlite" else ":memory:")
+    if backend != "supabase":
+        raise ValueError(f"Unknown FOODLENS_BACKEND: {backend!r} (expected supabase, sqlite or memory).")
+
+    url, key = _get_supabase_credentials()
+    if not url or not key:
+        raise ValueError("Missing Supabase environment variables. Check .env or Streamlit secrets.")
+
+    from supabase import create_client, ClientOptions
+
+    options = dict(
+        postgrest_client_timeout=settings["timeout"],
+        storage_client_timeout=settings["timeout"],
+    )
+    try:
+        # Newer supabase-py releases accept an injected httpx client shared by all sub-clients
+        opts = ClientOptions(httpx_client=_build_http_client(settings), **options)
+    except TypeError:
+        # Older releases still keep one session per sub-client, reused through the singleton
+        opts = ClientOptions(**options)
+    return create_client(url, key, options=opts)
+
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("Missing Supabase environment variables. Check .env or Streamlit secrets.")
+def get_client() -> "Client":
+    # Sharing one client (and its keep-alive connections) across the whole process
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
 
 
-def get_client() -> Client:
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
\ No newline at end of file
+def client_stats():
+    return http_stats.snapshot()
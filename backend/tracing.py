@@ -0,0 +1,373 @@
+"""
+Lightweight tracing: timers, counters and latency histograms, per Streamlit rerun.
+
+span("events.select", kind="io") times a block; @traced(...) does the same for
+a function. Every span feeds a latency histogram and an error counter keyed by
+(name, kind). Spans nest, and inside a rerun (begin_rerun()/end_rerun(), one
+per Streamlit script run) each span's self time is added to its kind: "io" for
+database/storage round trips, "compute" for model and rendering work. Whatever
+no span covered is reported as "other" (mostly Streamlit itself). That split
+shows where a slow rerun actually spends its time.
+
+Exports:
+    prometheus_text()         counters and histograms in Prometheus text format
+    write_jsonl(path)         appends one metrics snapshot line
+    FOODLENS_TRACE_JSONL=...  appends one line per finished rerun
+
+FOODLENS_PROFILE=1 makes start_profiler() run a sampling profiler thread that
+counts folded stacks (input for flamegraph.pl or speedscope) every
+FOODLENS_PROFILE_INTERVAL milliseconds and writes them to FOODLENS_PROFILE_OUT
+at exit. FOODLENS_TRACE=0 turns spans into no-ops.
+"""
+import atexit
+import bisect
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+TRACE = os.getenv("FOODLENS_TRACE", "1") == "1"
+TRACE_JSONL = os.getenv("FOODLENS_TRACE_JSONL")
+PROFILE = os.getenv("FOODLENS_PROFILE", "0") == "1"
+PROFILE_INTERVAL = float(os.getenv("FOODLENS_PROFILE_INTERVAL", "10"))
+PROFILE_OUT = os.getenv("FOODLENS_PROFILE_OUT", "profile.folded")
+
+# Finished reruns kept in memory for the debug panel
+RERUN_HISTORY = 50
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (None when empty)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+        }
+
+
+_lock = threading.Lock()
+# {(name, (("label", "value"), ...)): value}
+_counters = {}
+_histograms = {}
+_reruns = deque(maxlen=RERUN_HISTORY)
+
+# Innermost open span and the rerun being recorded, per thread (Streamlit runs each script run in its own thread)
+_active_span = contextvars.ContextVar("foodlens_span", default=None)
+_active_rerun = contextvars.ContextVar("foodlens_rerun", default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def count(name, value=1, /, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, /, **labels):
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram()
+        hist.observe(seconds)
+
+
+# Span histograms by (name, kind), skipping label sorting on the hot path
+_span_histograms = {}
+
+
+def _record(name, kind, elapsed, child, failed):
+    hist = _span_histograms.get((name, kind))
+    if hist is None:
+        key = _key("foodlens_span_seconds", {"span": name, "kind": kind})
+        with _lock:
+            hist = _span_histograms[(name, kind)] = _histograms.setdefault(key, Histogram())
+    with _lock:
+        hist.observe(elapsed)
+    if failed:
+        count("foodlens_span_errors_total", span=name, kind=kind)
+    rerun = _active_rerun.get()
+    if rerun is not None:
+        # Self time only, so a traced function wrapping an io span is not counted twice
+        rerun["kinds"][kind] += elapsed - child
+        stats = rerun["spans"].setdefault(name, {"kind": kind, "calls": 0, "seconds": 0.0})
+        stats["calls"] += 1
+        stats["seconds"] += elapsed
+
+
+class _Span:
+    __slots__ = ("name", "kind", "start", "child", "parent", "token")
+
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+
+    def __enter__(self):
+        self.parent = _active_span.get()
+        self.token = _active_span.set(self)
+        self.child = 0.0
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        _active_span.reset(self.token)
+        if self.parent is not None:
+            self.parent.child += elapsed
+        _record(self.name, self.kind, elapsed, self.child, exc_type is not None)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, kind="compute"):
+    """Context manager timing a block as `name`; kind is "io" or "compute"."""
+    return _Span(name, kind) if TRACE else _NO_SPAN
+
+
+def traced(name=None, kind="compute"):
+    """Decorator form of span(); the name defaults to module.qualname."""
+    def decorate(fn):
+        if not TRACE:
+            return fn
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        # Inlined span: the wrapped functions include per-rerun hot paths like recommend()
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            s = _Span(span_name, kind)
+            s.parent = _active_span.get()
+            token = _active_span.set(s)
+            s.child = 0.0
+            failed = True
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter() - start
+                _active_span.reset(token)
+                if s.parent is not None:
+                    s.parent.child += elapsed
+                _record(span_name, kind, elapsed, s.child, failed)
+        return wrapper
+    return decorate
+
+
+def begin_rerun(name="app"):
+    """Start attributing spans in this thread to a new rerun record."""
+    if not TRACE:
+        return None
+    rerun = {
+        "name": name,
+        "started_at": time.time(),
+        "start": time.perf_counter(),
+        "kinds": Counter({"io": 0.0, "compute": 0.0}),
+        "spans": {},
+    }
+    _active_rerun.set(rerun)
+    return rerun
+
+
+def end_rerun():
+    """Finish the current rerun and return its breakdown (milliseconds), or None."""
+    rerun = _active_rerun.get()
+    if rerun is None:
+        return None
+    _active_rerun.set(None)
+    total = time.perf_counter() - rerun["start"]
+    record = {
+        "name": rerun["name"],
+        "started_at": rerun["started_at"],
+        "total_ms": total * 1000,
+        "io_ms": rerun["kinds"]["io"] * 1000,
+        "compute_ms": rerun["kinds"]["compute"] * 1000,
+        "other_ms": max(total - sum(rerun["kinds"].values()), 0.0) * 1000,
+        "spans": {
+            name: {"kind": s["kind"], "calls": s["calls"], "ms": s["seconds"] * 1000}
+            for name, s in sorted(rerun["spans"].items(), key=lambda item: -item[1]["seconds"])
+        },
+    }
+    observe("foodlens_rerun_seconds", total, rerun=rerun["name"])
+    with _lock:
+        _reruns.append(record)
+    if TRACE_JSONL:
+        _append_jsonl(TRACE_JSONL, dict(record, type="rerun"))
+    return record
+
+
+def recent_reruns():
+    with _lock:
+        return list(_reruns)
+
+
+def snapshot():
+    with _lock:
+        counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in _counters.items()]
+        histograms = [{"name": n, "labels": dict(l), **h.to_dict()} for (n, l), h in _histograms.items()]
+    return {"counters": counters, "histograms": histograms}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _span_histograms.clear()
+        _reruns.clear()
+
+
+def _labels_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def prometheus_text():
+    """Every counter and histogram in the Prometheus text exposition format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items(), key=lambda item: item[0])
+        histograms = [(key, list(h.counts), h.sum, h.count, h.buckets) for key, h in histograms]
+
+    lines = []
+    typed = set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_labels_text(labels)} {value}")
+    for (name, labels), counts, total, n, buckets in histograms:
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, c in zip(list(buckets) + ["+Inf"], counts):
+            cumulative += c
+            lines.append(f"{name}_bucket{_labels_text(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_labels_text(labels)} {total}")
+        lines.append(f"{name}_count{_labels_text(labels)} {n}")
+    return "\n".join(lines) + "\n"
+
+
+def _append_jsonl(path, entry):
+    with open(path, "a") as f:
+        f.write(json.dumps(entry, default=str) + "\n")
+
+
+def write_jsonl(path):
+    """Append the current counters and histograms as one JSON line."""
+    _append_jsonl(path, dict(snapshot(), type="metrics", ts=time.time()))
+
+
+class SamplingProfiler:
+    """Samples every thread's Python stack at a fixed interval and counts folded stacks."""
+
+    def __init__(self, interval_ms=PROFILE_INTERVAL):
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="foodlens-profiler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def folded(self):
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def write(self, path=PROFILE_OUT):
+        with open(path, "w") as f:
+            f.write(self.folded())
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def start_profiler(enabled=PROFILE, interval_ms=PROFILE_INTERVAL, out=PROFILE_OUT):
+    """Start the process-wide sampling profiler when enabled (FOODLENS_PROFILE=1)."""
+    global _profiler
+    if not enabled:
+        return None
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = SamplingProfiler(interval_ms).start()
+            atexit.register(_profiler.write, out)
+    return _profiler
+
+
+def get_profiler():
+    return _profiler
@@ -0,0 +1,319 @@
+"""
+Optional write-behind queue for app inserts (events, subscribers, feedback).
+
+With FOODLENS_WRITE_BEHIND=1, insert_row() appends the row to a local spool
+file (one JSON line per row, fsynced) and returns right away. A background
+flusher coalesces queued rows into one multi-row insert per table, when
+FOODLENS_WRITE_BEHIND_BATCH rows are waiting or FOODLENS_WRITE_BEHIND_INTERVAL
+seconds have passed. After each successful flush, the highest flushed sequence
+number is written to <spool>.ack. On start-up, spooled rows past the ack are
+replayed, so a restart loses nothing. Rows carry client-side ids and are
+written with upsert(ignore_duplicates=True), so a row flushed just before a
+crash is not inserted twice.
+
+Rows with an updated_at are restamped at flush time, when they become visible,
+so delta readers (backend/event_sync.py) past an earlier watermark still see
+them. Each table is upserted separately. When the backend is unreachable
+(connection errors, timeouts, 5xx), the flush stops and every row stays spooled
+until it comes back, however long that takes. When the backend rejects a batch,
+its rows are retried one by one, and a row rejected
+FOODLENS_WRITE_BEHIND_MAX_ATTEMPTS times is moved to <spool>.dead instead of
+blocking the queue.
+
+Without the flag, insert_row() is a plain synchronous insert.
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from backend.supabase_client import get_client
+from backend.tracing import span
+
+WRITE_BEHIND = os.getenv("FOODLENS_WRITE_BEHIND", "0") == "1"
+SPOOL_PATH = os.getenv("FOODLENS_WRITE_SPOOL", "write_spool.jsonl")
+BATCH_SIZE = int(os.getenv("FOODLENS_WRITE_BEHIND_BATCH", "100"))
+FLUSH_INTERVAL = float(os.getenv("FOODLENS_WRITE_BEHIND_INTERVAL", "0.5"))
+# fsync every spooled row; 0 trades durability on power loss for lower latency
+SPOOL_FSYNC = os.getenv("FOODLENS_WRITE_SPOOL_FSYNC", "1") == "1"
+# Rejections of a single row before it is dead-lettered (outages do not count)
+MAX_ATTEMPTS = int(os.getenv("FOODLENS_WRITE_BEHIND_MAX_ATTEMPTS", "5"))
+
+# Callbacks run after rows of a table are flushed, e.g. cache invalidation
+_flush_hooks = {}
+
+
+def on_flush(table, callback):
+    _flush_hooks.setdefault(table, []).append(callback)
+
+
+# True when the backend could not be reached or was overloaded, rather than refusing the row itself
+def _is_outage(error):
+    import sqlite3
+
+    if isinstance(error, OSError):
+        return True
+    # The local backend's busy database, as opposed to e.g. an unknown column in the row
+    if isinstance(error, sqlite3.OperationalError) and "locked" in str(error):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    if isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, httpx.HTTPStatusError) and (
+        error.response.status_code >= 500 or error.response.status_code == 429
+    )
+
+
+class WriteBehindQueue:
+    def __init__(self, spool_path=SPOOL_PATH, batch_size=BATCH_SIZE, interval=FLUSH_INTERVAL, fsync=SPOOL_FSYNC,
+                 max_attempts=MAX_ATTEMPTS):
+        self.spool_path = spool_path
+        self.ack_path = spool_path + ".ack"
+        self.dead_path = spool_path + ".dead"
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.interval = interval
+        self.fsync = fsync
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._spool_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._seq = 0
+        self.acked = -1
+        self.latencies = deque(maxlen=1024)
+        self.stats = {"enqueued": 0, "replayed": 0, "flushed": 0, "flushes": 0, "failures": 0, "dead": 0,
+                      "last_error": None}
+        self._replay()
+
+    # Re-queueing spooled rows that were never acknowledged
+    def _replay(self):
+        try:
+            with open(self.ack_path) as f:
+                self.acked = int(f.read().strip() or -1)
+        except FileNotFoundError:
+            self.acked = -1
+        if not os.path.exists(self.spool_path):
+            return
+        # A later line with the same seq is a patched copy of the row (update_pending)
+        entries = {}
+        with open(self.spool_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write
+                    continue
+                self._seq = max(self._seq, entry["seq"] + 1)
+                if entry["seq"] > self.acked:
+                    entries[entry["seq"]] = entry
+        self._pending.extend(entries[seq] for seq in sorted(entries))
+        self.stats["replayed"] += len(entries)
+        self._seq = max(self._seq, self.acked + 1)
+
+    def _spool(self, entries):
+        with open(self.spool_path, "a") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, default=str) + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def put(self, table, row):
+        with self._spool_lock:
+            entry = {"seq": self._seq, "table": table, "row": row}
+            self._seq += 1
+            self._spool([entry])
+        with self._cond:
+            self._pending.append(entry)
+            self.stats["enqueued"] += 1
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        self.start()
+        return row
+
+    def start(self):
+        if self._thread is None:
+            with self._cond:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="foodlens-write-behind", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+
+    def _run(self):
+        backoff = self.interval
+        while True:
+            with self._cond:
+                if len(self._pending) < self.batch_size:
+                    self._cond.wait(timeout=backoff)
+            try:
+                self.flush()
+                backoff = self.interval
+            except Exception as e:
+                # Rows stay spooled and queued; back off up to 30s between attempts
+                print(f"Write-behind flush failed: {e}", file=sys.stderr)
+                backoff = min(max(backoff, 0.5) * 2, 30.0)
+
+    def flush(self):
+        """Write every queued row now, one bulk upsert per table. Returns rows written."""
+        with self._flush_lock:
+            with self._cond:
+                batch = list(self._pending)
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            # Stamping when rows become visible, not when they were queued
+            now = datetime.now(timezone.utc).isoformat()
+            by_table = {}
+            for entry in batch:
+                by_table.setdefault(entry["table"], []).append(entry)
+
+            done, written, errors = set(), {}, []
+            outage = False
+            for table, entries in by_table.items():
+                rows = [dict(e["row"], updated_at=now) if "updated_at" in e["row"] else e["row"] for e in entries]
+                try:
+                    with span(f"{table}.upsert", kind="io"):
+                        get_client().table(table).upsert(rows, ignore_duplicates=True).execute()
+                    done.update(e["seq"] for e in entries)
+                    written[table] = len(entries)
+                    continue
+                except Exception as e:
+                    errors.append(e)
+                    outage = _is_outage(e)
+                if outage:
+                    # Nothing is wrong with the rows; keep them all spooled until the backend is back
+                    break
+                # Isolating the rows the backend rejects so the rest of the table goes through
+                for entry, row in zip(entries, rows):
+                    try:
+                        get_client().table(table).upsert([row], ignore_duplicates=True).execute()
+                    except Exception as e:
+                        if _is_outage(e):
+                            errors.append(e)
+                            outage = True
+                            break
+                        entry["attempts"] = entry.get("attempts", 0) + 1
+                        if entry["attempts"] >= self.max_attempts:
+                            self._dead_letter(entry, e)
+                            done.add(entry["seq"])
+                        continue
+                    done.add(entry["seq"])
+                    written[table] = written.get(table, 0) + 1
+                if outage:
+                    break
+
+            with self._cond:
+                self._pending = deque(e for e in self._pending if e["seq"] not in done)
+                self.stats["flushed"] += sum(written.values())
+                self.stats["flushes"] += 1
+                if errors:
+                    self.stats["failures"] += 1
+                    self.stats["last_error"] = str(errors[-1])
+                self.latencies.append(time.perf_counter() - start)
+                # Acknowledging up to the oldest row still queued; replaying flushed rows past it is harmless
+                oldest = self._pending[0]["seq"] if self._pending else None
+                drained = oldest is None
+            acked = (oldest - 1) if oldest is not None else max(e["seq"] for e in batch)
+            if acked > self.acked:
+                self._ack(acked, drained)
+
+        for table in written:
+            for callback in _flush_hooks.get(table, []):
+                callback()
+        if errors and any(e["seq"] not in done for e in batch):
+            raise errors[-1]
+        return sum(written.values())
+
+    def update_pending(self, table, column, value, values):
+        """Apply values to queued rows of table whose column equals value; return how many changed."""
+        # Holding the flush lock, so a flush already building its batch finishes first
+        with self._flush_lock:
+            with self._cond:
+                changed = []
+                for entry in self._pending:
+                    if entry["table"] == table and entry["row"].get(column) == value:
+                        entry["row"].update(values)
+                        changed.append(dict(entry, row=dict(entry["row"])))
+            if changed:
+                # Re-spooled under the same seq, so a replay after a crash sends the patched row
+                with self._spool_lock:
+                    self._spool(changed)
+        return len(changed)
+
+    def _dead_letter(self, entry, error):
+        print(f"Write-behind: giving up on {entry['table']} row after {entry['attempts']} attempts: {error}",
+              file=sys.stderr)
+        with open(self.dead_path, "a") as f:
+            f.write(json.dumps(dict(entry, error=str(error)), default=str) + "\n")
+        with self._cond:
+            self.stats["dead"] += 1
+
+    def _ack(self, seq, drained):
+        with self._spool_lock:
+            tmp_path = self.ack_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(str(seq))
+            os.replace(tmp_path, self.ack_path)
+            self.acked = seq
+            # Everything spooled is flushed, so the spool can start over (seq keeps counting)
+            if drained and self._seq == seq + 1:
+                open(self.spool_path, "w").close()
+
+    def snapshot(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats["queue_depth"] = len(self._pending)
+            latencies = sorted(self.latencies)
+        stats["spool_bytes"] = os.path.getsize(self.spool_path) if os.path.exists(self.spool_path) else 0
+        for name, q in (("p50", 0.50), ("p95", 0.95)):
+            stats[f"flush_ms_{name}"] = (
+                latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else None
+            )
+        stats["flush_ms_max"] = latencies[-1] * 1000 if latencies else None
+        return stats
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = WriteBehindQueue()
+                # Replayed rows from a previous run go out without waiting for new writes
+                if _queue._pending:
+                    _queue.start()
+    return _queue
+
+
+def insert_row(table, row):
+    """Insert one row now, or queue it when write-behind is enabled."""
+    if not WRITE_BEHIND:
+        with span(f"{table}.insert", kind="io"):
+            get_client().table(table).insert(row).execute()
+        return row
+    with span(f"{table}.spool", kind="io"):
+        return get_queue().put(table, row)
+
+
+def update_pending(table, column, value, values):
+    """Patch rows still waiting in the write-behind queue (no-op without it)."""
+    if not WRITE_BEHIND:
+        return 0
+    return get_queue().update_pending(table, column, value, values)
+
+
+def write_behind_stats():
+    return get_queue().snapshot() if WRITE_BEHIND else None
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for FoodLens.
+
+Everything runs against the in-process SQLite backend (FOODLENS_BACKEND=memory)
+and synthetic data, at 1x/10x/100x of a base size:
+
+    recommend.cold      first recommend() in a fresh interpreter (imports + load)
+    recommend.warm      recommend() on random form inputs in a warm process
+    recommend_many      batch predictions per second
+    fetch_events        filtered active-event query (cache cleared every call)
+    event_sync          filtered read from the shared event snapshot
+    train               fitting the tree + building the engine/lookup table
+    browse_render       headless run of frontend/app.py (needs streamlit)
+
+Results go to a JSON file. With --compare, every metric is checked against a
+previous result and runs that got more than --threshold worse are flagged
+(exit code 1).
+
+Usage:
+    python benchmarks/run.py [--scales 1,10,100] [--only recommend,fetch_events]
+                             [--out benchmarks/results/latest.json]
+                             [--compare benchmarks/results/baseline.json] [--threshold 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+
+os.environ["FOODLENS_BACKEND"] = "memory"
+os.environ.setdefault("FOODLENS_NOTIFY_TRANSPORT", "none")
+os.environ.setdefault("FOODLENS_EXPIRY_TICK", "0")
+
+# Base sizes multiplied by the scale factor
+BASE_EVENTS = 1_000
+BASE_TRAIN_ROWS = 350
+BASE_BATCH_ROWS = 10_000
+WARM_CALLS = 5_000
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+ZONES = ["north", "south", "east", "west"]
+DIETS = ["vegan", "vegetarian", "non-vegetarian", "mixed"]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "median": statistics.median(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+        "min": ordered[0],
+        "n": len(ordered),
+    }
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def result(name, scale, unit, stats, better="lower"):
+    return dict({"name": name, "scale": scale, "unit": unit, "better": better}, **stats)
+
+
+# Swapping in a fresh in-memory backend seeded with n events
+def fresh_backend(n_events):
+    import backend.event_sync as event_sync
+    import backend.supabase_client as supabase_client
+    from backend.events import invalidate_events_cache
+    from backend.local_client import LocalClient, seed_events
+
+    client = LocalClient(":memory:")
+    seed_events(client, n_events, seed=7, active_ratio=0.3)
+    supabase_client._client = client
+    event_sync._snapshot = None
+    invalidate_events_cache()
+    return client
+
+
+def random_forms(n, seed=0):
+    from model.generate_dataset import campus_buildings, day_of_week, event_times, event_types
+
+    rng = random.Random(seed)
+    buildings = list(campus_buildings)
+    return [
+        {
+            "building": (b := rng.choice(buildings)),
+            "zone": campus_buildings[b],
+            "event_type": rng.choice(event_types),
+            "day": rng.choice(day_of_week),
+            "time": rng.choice(event_times),
+            "rsvps": rng.randint(0, 500),
+            "planned_food": rng.randint(0, 600),
+        }
+        for _ in range(n)
+    ]
+
+
+def bench_recommend_cold(scale):
+    # Scale-independent: a fresh interpreter importing the predictor and answering once
+    code = (
+        "import time; t = time.perf_counter(); "
+        "from model.predictor import recommend; "
+        "recommend('Boelter Hall', 'north', 'club', 'wed', '18:00', 150, 160); "
+        "print(time.perf_counter() - t)"
+    )
+    samples = []
+    for _ in range(5):
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return [result("recommend.cold", 1, "ms", {k: v * 1000 if k != "n" else v for k, v in summarize(samples).items()})]
+
+
+def bench_recommend_warm(scale):
+    from model.predictor import _predict_memo, recommend
+
+    forms = random_forms(WARM_CALLS)
+    recommend(**forms[0])
+    _predict_memo.cache_clear()
+    samples = []
+    for f in forms:
+        start = time.perf_counter()
+        recommend(**f)
+        samples.append(time.perf_counter() - start)
+    stats = summarize(samples)
+    return [result("recommend.warm", 1, "us", {k: v * 1e6 if k != "n" else v for k, v in stats.items()})]
+
+
+def bench_recommend_many(scale):
+    import pandas as pd
+
+    from model.predictor import recommend_many
+
+    n = BASE_BATCH_ROWS * scale
+    forms = random_forms(min(n, 20_000), seed=1)
+    events = pd.DataFrame(forms * (n // len(forms) + 1)).iloc[:n]
+    samples = timed(lambda: recommend_many(events), 3)
+    return [result("recommend_many", scale, "rows/s", {"median": n / statistics.median(samples),
+                                                       "min": n / max(samples), "n": len(samples)}, better="higher")]
+
+
+def bench_fetch_events(scale):
+    from backend.events import fetch_events, invalidate_events_cache
+
+    fresh_backend(BASE_EVENTS * scale)
+    rng = random.Random(2)
+
+    def run():
+        invalidate_events_cache()
+        fetch_events(active=True, zones=rng.sample(ZONES, 2), diets=rng.sample(DIETS, 3))
+
+    samples = timed(run, 20)
+    return [result("fetch_events", scale, "ms", {k: v * 1000 if k != "n" else v for k, v in summarize(samples).items()})]
+
+
+def bench_event_sync(scale):
+    from backend.event_sync import active_events
+
+    fresh_backend(BASE_EVENTS * scale)
+    start = time.perf_counter()
+    active_events()
+    load = time.perf_counter() - start
+    rng = random.Random(3)
+    samples = timed(lambda: active_events(zones=rng.sample(ZONES, 2), diets=rng.sample(DIETS, 3)), 50)
+    return [
+        result("event_sync.load", scale, "ms", {"median": load * 1000, "n": 1}),
+        result("event_sync.read", scale, "ms", {k: v * 1000 if k != "n" else v for k, v in summarize(samples).items()}),
+    ]
+
+
+def bench_train(scale):
+    import numpy as np
+
+    from model.generate_dataset import past_events_chunk
+    from model.train_model import FEATURES, build_pipeline, tree_arrays
+    from model.tree_engine import TreeEngine, build_table
+
+    df = past_events_chunk(np.random.RandomState(4), BASE_TRAIN_ROWS * scale, 0)
+
+    def run():
+        model = build_pipeline()
+        model.fit(df[FEATURES], df["expected_attendance"])
+        build_table(TreeEngine(tree_arrays(model), {"version": "bench"}))
+
+    run()
+    samples = timed(run, 3)
+    return [result("train", scale, "ms", {k: v * 1000 if k != "n" else v for k, v in summarize(samples).items()})]
+
+
+def bench_browse_render(scale):
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        # Recorded rather than dropped, so a comparison shows the render was not measured
+        return [result("browse_render", scale, "ms", {"median": None, "n": 0, "skipped": "streamlit is not installed"})]
+
+    fresh_backend(BASE_EVENTS * scale)
+
+    def run():
+        AppTest.from_file(os.path.join(ROOT, "frontend", "app.py"), default_timeout=120).run()
+
+    samples = timed(run, 3)
+    return [result("browse_render", scale, "ms", {k: v * 1000 if k != "n" else v for k, v in summarize(samples).items()})]
+
+
+# name -> (function, runs once rather than per scale)
+BENCHMARKS = {
+    "recommend.cold": (bench_recommend_cold, True),
+    "recommend.warm": (bench_recommend_warm, True),
+    "recommend_many": (bench_recommend_many, False),
+    "fetch_events": (bench_fetch_events, False),
+    "event_sync": (bench_event_sync, False),
+    "train": (bench_train, False),
+    "browse_render": (bench_browse_render, False),
+}
+
+
+def compare(results, baseline, threshold):
+    """Print per-metric changes against a baseline; return the regressed entries."""
+    old = {(r["name"], r["scale"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'benchmark':24} {'scale':>5} {'baseline':>12} {'current':>12} {'change':>8}")
+    for r in results:
+        base = old.get((r["name"], r["scale"]))
+        if base is None or not base["median"] or r["median"] is None:
+            continue
+        change = (r["median"] - base["median"]) / base["median"]
+        worse = change > threshold if r["better"] == "lower" else change < -threshold
+        flag = "  REGRESSION" if worse else ""
+        print(f"{r['name']:24} {r['scale']:>4}x {base['median']:12.2f} {r['median']:12.2f} {change:+8.1%}{flag}")
+        if worse:
+            regressions.append(r)
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run FoodLens benchmarks offline.")
+    parser.add_argument("--scales", default="1,10,100", help="comma-separated scale factors")
+    parser.add_argument("--only", help="comma-separated benchmark name prefixes")
+    parser.add_argument("--out", help="result JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="baseline result JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    scales = [int(s) for s in args.scales.split(",")]
+    only = args.only.split(",") if args.only else None
+
+    results = []
+    for name, (fn, once) in BENCHMARKS.items():
+        if only and not any(name.startswith(p) for p in only):
+            continue
+        for scale in scales[:1] if once else scales:
+            print(f"running {name}" + ("" if once else f" @ {scale}x"))
+            for r in fn(scale):
+                results.append(r)
+                if r["median"] is None:
+                    print(f"     {r['name']:22} skipped: {r['skipped']}")
+                else:
+                    print(f"     {r['name']:22} {r['median']:12.2f} {r['unit']}")
+
+    doc = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scales": scales,
+        },
+        "results": results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(doc, f, indent=2)
+    print(f"WROTE: {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
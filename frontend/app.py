@@ -5,13 +5,25 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import streamlit as st
-import folium
-from streamlit_folium import st_folium
 
-from model.predictor import recommend
-from backend.events import add_event, fetch_events, deactivate_event
-from backend.supabase_client import get_client
+# Heavy modules (folium, the predictor's NumPy stack, supabase) are imported
+# where they are first needed so the header paints before they load.
+from backend.events import add_event, deactivate_event
+from backend.event_sync import active_events as synced_active_events, active_events_page
 from backend.subscribers import add_subscriber
+from backend.expiry import start_sweeper
+from model.refresh import start_refresher
+from backend.tracing import begin_rerun, end_rerun, span, start_profiler
+
+# Attributing this script run's spans (I/O vs compute) to one rerun record
+begin_rerun("app")
+
+# Closing "Until specific time" events once their time passes (FOODLENS_EXPIRY_TICK=0 disables)
+start_sweeper()
+# Retraining from closed events in a daemon thread when FOODLENS_REFRESH_INTERVAL is set
+start_refresher()
+# Sampling stacks into profile.folded when FOODLENS_PROFILE=1
+start_profiler()
 
 # ----------------- PAGE CONFIG -----------------
 st.set_page_config(page_title="FoodLens", layout="wide")
@@ -28,22 +40,26 @@ st.markdown(
 
 st.title("FoodLens: UCLA Food Sharing & Planning")
 
-# ----------------- APPROX BUILDING COORDS -----------------
+# ----------------- BUILDING COORDS -----------------
+# Building centers as drawn on the campus map, located with frontend/map_view.py's control-point fit
 BUILDING_COORDS = {
-    "Boelter Hall": (34.0689, -118.4441),
-    "Math Sciences": (34.0686, -118.4429),
-    "Engineering VI": (34.0683, -118.4455),
-    "Royce Hall": (34.0722, -118.4421),
-    "Haines Hall": (34.0715, -118.4422), 
-    "Kaplan Hall": (34.0718, -118.4419),
-    "Anderson": (34.0736, -118.4422),
-    "UCLA Law": (34.0731, -118.4410),
-    "Gonda": (34.0698, -118.4490),
-    "Pauley Pavilion": (34.0703, -118.4469),
-    "Hedrick Hall": (34.0716, -118.4503),
-    "Sproul Hall": (34.0710, -118.4509),
+    "Boelter Hall": (34.0686, -118.4428),
+    "Math Sciences": (34.0696, -118.4426),
+    "Engineering VI": (34.0696, -118.4444),
+    "Royce Hall": (34.0728, -118.4420),
+    "Haines Hall": (34.0728, -118.4410),
+    "Kaplan Hall": (34.0715, -118.4411),
+    "Anderson": (34.0737, -118.4433),
+    "UCLA Law": (34.0728, -118.4383),
+    "Gonda": (34.0674, -118.4447),
+    "Pauley Pavilion": (34.0703, -118.4467),
+    "Hedrick Hall": (34.0733, -118.4523),
+    "Sproul Hall": (34.0722, -118.4500),
 }
 
+# Event cards rendered per Browse page
+EVENTS_PAGE_SIZE = 10
+
 # ----------------- TABS -----------------
 tab_add, tab_browse, tab_predict, tab_feedback = st.tabs(
     ["Add Event", "Browse Events", "Food Surplus Predictor", "Contact Us"]
@@ -71,28 +87,15 @@ with tab_add:
         submitted = st.form_submit_button("Add Event")
 
     if submitted:
-        img_path = None
+        img_path, img_future = None, None
         if uploaded_image:
-            import uuid
-
-            sb = get_client()
-            ext = uploaded_image.name.split(".")[-1]
-            file_name = f"{uuid.uuid4()}.{ext}"
-
-            # Upload to Supabase storage
-            sb.storage.from_("event-images").upload(
-                file_name,
-                uploaded_image.getvalue(),
-                file_options={"content-type": uploaded_image.type},
-            )
+            from backend.images import ingest_image
 
-            # Public URL
-            base = sb.storage.from_("event-images").get_public_url(file_name)
-            img_path = (
-                base
-                if base.startswith("http")
-                else f"{sb.supabase_url}/storage/v1/object/public/event-images/{file_name}"
-            )
+            # Resized, thumbnailed and uploaded in the background under a content-hash name
+            try:
+                img_path, img_future = ingest_image(uploaded_image.getvalue())
+            except ValueError as e:
+                st.warning(f"The image could not be used ({e}); the event will be saved without it.")
 
         new_event = {
             "building": building,
@@ -111,13 +114,18 @@ with tab_add:
         }
 
         add_event(new_event)
-        st.success("Event added (persistent via Supabase)!")
+        st.success("Event added (persistent via Supabase)! Matching subscribers will be notified.")
+        # A failure before the insert happened is not covered by the upload callback's cleanup
+        if img_future is not None and img_future.done() and img_future.exception() is not None:
+            from backend.images import clear_image_url
+
+            clear_image_url(img_path)
+            st.warning(f"The image could not be uploaded ({img_future.exception()}); the event was saved without it.")
 
     # -------- CLOSE EVENT --------
     st.subheader("Close an Event")
 
-    all_events = fetch_events()
-    active_events_close = [e for e in all_events if e.get("is_active")]
+    active_events_close = synced_active_events()
 
     if active_events_close:
         # Sequential numbering based on active events only
@@ -125,11 +133,19 @@ with tab_add:
         label_options = [f"{num}. {e['building']}" for num, e in numbered]
         selected_label = st.selectbox("Select event to close", label_options)
         close_reason = st.text_input("Reason for closing (e.g., food over, moved)")
+        # Optional outcome counts; 0 means "not recorded" and is not used for training
+        close_rsvps = st.number_input("RSVP count (optional)", min_value=0, max_value=2000, value=0)
+        close_attendance = st.number_input("Actual attendance (optional)", min_value=0, max_value=2000, value=0)
 
         if st.button("Close selected event"):
             idx = int(selected_label.split(".")[0]) - 1
             event_id = active_events_close[idx]["id"]
-            deactivate_event(event_id, close_reason)
+            deactivate_event(
+                event_id,
+                close_reason,
+                rsvps=close_rsvps or None,
+                attendance=close_attendance or None,
+            )
             st.success(f"Closed event: {selected_label}")
     else:
         st.info("No active events to close.")
@@ -201,43 +217,24 @@ with tab_browse:
         default=["vegan", "vegetarian", "non-vegetarian", "mixed"],
     )
 
-    events = fetch_events()
-    active_events = [
-        e
-        for e in events
-        if e.get("is_active") and e.get("zone") in f_zone and e.get("diet") in f_diet
-    ]
+    # Served from the process-wide snapshot, which pulls only changed rows
+    active_events = synced_active_events(zones=f_zone, diets=f_diet)
 
     # Sequential numbering for UI (based only on active + filtered events)
     for i, e in enumerate(active_events):
         e["display_id"] = i + 1
 
-    # Map rendering
-    focus = st.session_state.get("focus_event")
-
-    if focus:
-        lat, lon = BUILDING_COORDS.get(focus["building"], (34.0689, -118.4452))
-        m = folium.Map(location=[lat, lon], zoom_start=18)
-        folium.Marker(
-            location=[lat, lon],
-            popup=f"{focus['display_id']} — {focus['building']}",
-            tooltip="Focused Event",
-            icon=folium.Icon(color="red"),
-        ).add_to(m)
-    else:
-        m = folium.Map(location=[34.0689, -118.4452], zoom_start=16)
+    # Map rendering: clustered per-building markers, limited to the last viewport
+    from streamlit_folium import st_folium
+    from frontend.map_view import get_map
 
-    for e in active_events:
-        if focus and e["id"] == focus["id"]:
-            continue
-        lat, lon = BUILDING_COORDS.get(e["building"], (34.0689, -118.4452))
-        folium.Marker(
-            location=[lat, lon],
-            popup=f"{e['display_id']} - {e['building']} ({e['event_type']})",
-            tooltip=e["food_desc"],
-        ).add_to(m)
-
-    st_folium(m, width=700, height=450)
+    focus = st.session_state.get("focus_event")
+    # st_folium stores its last return value (bounds/center/zoom) under its key
+    with span("frontend.build_map"):
+        m = get_map(active_events, BUILDING_COORDS, view=st.session_state.get("browse_map"), focus=focus)
+    # st_folium serializes the map to HTML/JS on every rerun
+    with span("frontend.st_folium"):
+        st_folium(m, width=700, height=450, key="browse_map", returned_objects=["bounds", "center", "zoom"])
 
     # Event cards
     st.markdown("### Active Events")
@@ -275,10 +272,24 @@ with tab_browse:
         unsafe_allow_html=True,
     )
 
-    if not active_events:
+    # One page of cards per rerun; cursors of visited pages allow going back
+    page_key = (tuple(sorted(f_zone)), tuple(sorted(f_diet)))
+    if st.session_state.get("browse_page_key") != page_key:
+        st.session_state["browse_page_key"] = page_key
+        st.session_state["browse_cursors"] = [None]
+    cursors = st.session_state["browse_cursors"]
+    page_events, next_cursor = active_events_page(
+        zones=f_zone, diets=f_diet, page_size=EVENTS_PAGE_SIZE, cursor=cursors[-1]
+    )
+    # Numbering continues across pages so it matches the map popups
+    offset = (len(cursors) - 1) * EVENTS_PAGE_SIZE
+    for i, e in enumerate(page_events):
+        e["display_id"] = offset + i + 1
+
+    if not page_events:
         st.write("No events match your filters.")
     else:
-        for e in active_events:
+        for e in page_events:
             with st.expander(f"{e['display_id']} — {e['building']}"):
                 st.markdown(
                     f"""
@@ -296,9 +307,12 @@ with tab_browse:
                     unsafe_allow_html=True,
                 )
 
-                if e.get("image_url"):
+                # Images load only when asked for, not for every card on every rerun
+                if e.get("image_url") and st.toggle("Show image", key=f"img_{e['id']}"):
+                    from backend.images import thumbnail_url
+
                     st.image(
-                        e["image_url"],
+                        thumbnail_url(e["image_url"]),
                         width=260,
                         caption=f"Event {e['display_id']} image",
                     )
@@ -315,6 +329,18 @@ with tab_browse:
                     st.session_state["focus_event"] = e
                     st.success(f"Centered event {e['display_id']} on map.")
 
+        prev_col, page_col, next_col = st.columns(3)
+        with prev_col:
+            if len(cursors) > 1 and st.button("← Newer events"):
+                cursors.pop()
+                st.rerun()
+        with page_col:
+            st.caption(f"Page {len(cursors)} · events {offset + 1}–{offset + len(page_events)} of {len(active_events)}")
+        with next_col:
+            if next_cursor is not None and st.button("Older events →"):
+                cursors.append(next_cursor)
+                st.rerun()
+
 # ======================================================
 # TAB C: FOOD SURPLUS PREDICTOR — WITH TESTIMONIALS ALWAYS VISIBLE
 # ======================================================
@@ -351,6 +377,8 @@ with tab_predict:
         )
 
         if st.button("Get Recommendation"):
+            from model.predictor import recommend
+
             st.session_state["pred_result"] = recommend(
                 building=building,
                 zone=zone,
@@ -411,10 +439,19 @@ with tab_feedback:
     msg = st.text_area("Message")
 
     if st.button("Submit feedback"):
-        sb = get_client()
-        sb.table("feedback").insert(
-            {"name": name, "email": email, "message": msg}
-        ).execute()
+        import uuid
+        from datetime import datetime, timezone
+
+        from backend.write_behind import insert_row
+
+        # Client-side id/created_at so a replayed write-behind row is not stored twice
+        insert_row("feedback", {
+            "id": str(uuid.uuid4()),
+            "name": name,
+            "email": email,
+            "message": msg,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        })
         st.success("Thanks! Your feedback has been recorded.")
 
 # ----------------- FOOTER -----------------
@@ -427,3 +464,20 @@ st.markdown(
 """,
     unsafe_allow_html=True,
 )
+
+# ----------------- RERUN TIMING -----------------
+rerun = end_rerun()
+if rerun is not None and os.getenv("FOODLENS_TRACE_PANEL", "0") == "1":
+    with st.expander("Rerun timing"):
+        st.write(
+            f"Total {rerun['total_ms']:.1f} ms · I/O {rerun['io_ms']:.1f} ms · "
+            f"compute {rerun['compute_ms']:.1f} ms · other {rerun['other_ms']:.1f} ms"
+        )
+        st.table([
+            {"span": name, "kind": s["kind"], "calls": s["calls"], "ms": round(s["ms"], 2)}
+            for name, s in rerun["spans"].items()
+        ])
+
+        from backend.tracing import prometheus_text
+
+        st.download_button("Download metrics (Prometheus)", prometheus_text(), file_name="foodlens_metrics.txt")
@@ -0,0 +1,240 @@
+"""
+Browse-tab map: one clustered marker per building, limited to the viewport.
+
+Events at the same building share a coordinate, so they are grouped into a
+single marker whose popup lists them; MarkerCluster then merges nearby
+buildings when zoomed out. Only buildings inside the last reported viewport
+(padded) are sent to the browser, and built maps are cached per
+(event set, view, focus) so reruns that change nothing reuse the same object.
+
+When scripts/convert_map.py has built the campus map tile pyramid, it is added
+as a local tile layer, so the browser only downloads the tiles in view.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_CENTER = (34.0689, -118.4452)
+DEFAULT_ZOOM = 16
+
+# Events listed in one building popup before collapsing into "+N more"
+POPUP_LIMIT = 10
+# Extra margin around the viewport, as a fraction of its height/width
+VIEWPORT_PAD = 0.5
+MAP_CACHE_SIZE = 32
+
+# Size of public/UCLA_MAP.png that the control points below are measured on
+MAP_IMAGE_SIZE = (626, 812)
+# Landmarks on the campus map: name -> (x, y) pixel on public/UCLA_MAP.png, (lat, lon) on the ground
+MAP_CONTROL_POINTS = {
+    "Royce Hall": ((456.7, 234.0), (34.07284, -118.44214)),
+    "Powell Library": ((456.7, 280.0), (34.07163, -118.44222)),
+    "Young Research Library": ((483.8, 156.3), (34.07500, -118.44147)),
+    "Anderson School": ((416.0, 198.8), (34.07398, -118.44365)),
+    "Law School": ((570.0, 232.5), (34.07276, -118.43847)),
+    "Pauley Pavilion": ((310.0, 325.0), (34.07039, -118.44686)),
+    "Ackerman Union": ((386.7, 325.0), (34.07046, -118.44437)),
+    "Drake Stadium": ((263.3, 265.0), (34.07194, -118.44756)),
+    "Hedrick Hall": ((136.0, 215.0), (34.07343, -118.45216)),
+    "Sproul Hall": ((208.3, 255.0), (34.07183, -118.45009)),
+    "Ronald Reagan Medical Center": ((316.7, 460.0), (34.06636, -118.44588)),
+    "Hammer Museum": ((403.8, 726.3), (34.05934, -118.44355)),
+}
+
+
+def _mercator(lat, lon):
+    s = math.sin(math.radians(lat))
+    return (lon + 180) / 360, 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+
+
+def _unmercator(x, y):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y)))), x * 360 - 180
+
+
+def fit_bounds(points, size):
+    """
+    (south, west, north, east) edges of a north-up map image, from control points.
+
+    Least-squares fit of one scale and an offset from image pixels to Web
+    Mercator, so the bounds keep the image's own aspect ratio and tiles are
+    not stretched against the base map.
+    """
+    pixels = [p for p, _ in points]
+    merc = [_mercator(*latlon) for _, latlon in points]
+    n = len(pixels)
+    px, py = sum(p[0] for p in pixels) / n, sum(p[1] for p in pixels) / n
+    mx, my = sum(m[0] for m in merc) / n, sum(m[1] for m in merc) / n
+    scale = sum((p[0] - px) * (m[0] - mx) + (p[1] - py) * (m[1] - my) for p, m in zip(pixels, merc)) / sum(
+        (p[0] - px) ** 2 + (p[1] - py) ** 2 for p in pixels
+    )
+    left, top = mx - scale * px, my - scale * py
+    north, west = _unmercator(left, top)
+    south, east = _unmercator(left + scale * size[0], top + scale * size[1])
+    return south, west, north, east
+
+
+# (south, west, north, east) edges of public/UCLA_MAP.png; the map is drawn north-up
+CAMPUS_BOUNDS = fit_bounds(list(MAP_CONTROL_POINTS.values()), MAP_IMAGE_SIZE)
+# Tiles live under Streamlit's static folder (server.enableStaticServing) next to app.py
+TILES_DIR = "frontend/static/tiles"
+TILE_URL = os.getenv("FOODLENS_TILE_URL", "/app/static/tiles/{z}/{x}/{y}.png")
+MAP_TILES = os.getenv("FOODLENS_MAP_TILES", "1") == "1"
+# Leaflet upscales the deepest generated level up to this zoom
+MAP_MAX_ZOOM = 19
+
+_map_cache = OrderedDict()
+_map_cache_lock = threading.Lock()
+
+
+# Grouping events by building coordinate: {(lat, lon): (building, [events])}
+def group_events(events, coords):
+    groups = {}
+    for e in events:
+        latlon = coords.get(e["building"], DEFAULT_CENTER)
+        groups.setdefault(latlon, (e["building"], []))[1].append(e)
+    return groups
+
+
+# Keeping groups inside st_folium's {"_southWest": {...}, "_northEast": {...}} bounds
+def in_view(groups, bounds, pad=VIEWPORT_PAD):
+    if not bounds or not bounds.get("_southWest") or not bounds.get("_northEast"):
+        return groups
+    south, west = bounds["_southWest"]["lat"], bounds["_southWest"]["lng"]
+    north, east = bounds["_northEast"]["lat"], bounds["_northEast"]["lng"]
+    dlat, dlon = (north - south) * pad, (east - west) * pad
+    return {
+        (lat, lon): g for (lat, lon), g in groups.items()
+        if south - dlat <= lat <= north + dlat and west - dlon <= lon <= east + dlon
+    }
+
+
+def events_digest(events):
+    h = hashlib.sha1()
+    for e in events:
+        h.update(repr((e.get("id"), e.get("display_id"), e.get("building"), e.get("event_type"),
+                       e.get("food_desc"))).encode())
+    return h.hexdigest()
+
+
+def _bounds_key(bounds):
+    if not bounds or not bounds.get("_southWest") or not bounds.get("_northEast"):
+        return None
+    return tuple(round(bounds[corner][axis], 4) for corner in ("_southWest", "_northEast") for axis in ("lat", "lng"))
+
+
+def _popup(building, events):
+    lines = [f"<b>{building}</b> ({len(events)} event{'s' if len(events) != 1 else ''})"]
+    for e in events[:POPUP_LIMIT]:
+        lines.append(f"{e['display_id']} - {e['event_type']}: {e.get('food_desc') or ''}")
+    if len(events) > POPUP_LIMIT:
+        lines.append(f"+{len(events) - POPUP_LIMIT} more")
+    return "<br>".join(lines)
+
+
+_tile_manifest = {"stamp": None, "manifest": None}
+
+
+# Reading the tile manifest, re-read only when convert_map.py rewrites it
+def tile_manifest(tiles_dir=TILES_DIR):
+    path = os.path.join(tiles_dir, "manifest.json")
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    stamp = (path, st.st_mtime_ns, st.st_size)
+    if _tile_manifest["stamp"] != stamp:
+        with open(path) as f:
+            _tile_manifest["manifest"] = json.load(f)
+        _tile_manifest["stamp"] = stamp
+    return _tile_manifest["manifest"]
+
+
+def add_campus_tiles(m, manifest):
+    import folium
+
+    south, west, north, east = manifest["bounds"]
+    folium.TileLayer(
+        tiles=TILE_URL,
+        attr="UCLA campus map",
+        name="UCLA campus map",
+        overlay=True,
+        min_zoom=manifest["min_zoom"],
+        max_native_zoom=manifest["max_zoom"],
+        max_zoom=MAP_MAX_ZOOM,
+        # Keeps Leaflet from requesting tiles outside the pyramid
+        bounds=[[south, west], [north, east]],
+        opacity=0.85,
+    ).add_to(m)
+
+
+def build_map(groups, center, zoom, focus=None, focus_latlon=None, manifest=None):
+    import folium
+    from folium.plugins import MarkerCluster
+
+    m = folium.Map(location=list(center), zoom_start=zoom, max_zoom=MAP_MAX_ZOOM)
+    if manifest:
+        add_campus_tiles(m, manifest)
+    if focus:
+        folium.Marker(
+            location=list(focus_latlon),
+            popup=f"{focus['display_id']} — {focus['building']}",
+            tooltip="Focused Event",
+            icon=folium.Icon(color="red"),
+        ).add_to(m)
+
+    cluster = MarkerCluster().add_to(m)
+    for (lat, lon), (building, events) in groups.items():
+        if focus:
+            events = [e for e in events if e["id"] != focus["id"]]
+            if not events:
+                continue
+        folium.Marker(
+            location=[lat, lon],
+            popup=folium.Popup(_popup(building, events), max_width=300),
+            tooltip=f"{building}: {len(events)} event{'s' if len(events) != 1 else ''}",
+        ).add_to(cluster)
+    return m
+
+
+def get_map(events, coords, view=None, focus=None):
+    """
+    Return a folium.Map for events, reusing a cached one when nothing changed.
+
+    view: the last st_folium return value ({"bounds", "center", "zoom"}) or None.
+    focus: event to highlight and center on, or None.
+    """
+    view = view or {}
+    if focus:
+        focus_latlon = coords.get(focus["building"], DEFAULT_CENTER)
+        center, zoom = focus_latlon, 18
+    else:
+        focus_latlon = None
+        c = view.get("center")
+        center = (c["lat"], c["lng"]) if c else DEFAULT_CENTER
+        zoom = view.get("zoom") or DEFAULT_ZOOM
+
+    groups = in_view(group_events(events, coords), view.get("bounds"))
+    manifest = tile_manifest() if MAP_TILES else None
+    key = (
+        manifest["key"] if manifest else None,
+        events_digest(e for g in groups.values() for e in g[1]),
+        tuple(round(v, 5) for v in center),
+        zoom,
+        _bounds_key(view.get("bounds")),
+        focus["id"] if focus else None,
+    )
+    with _map_cache_lock:
+        m = _map_cache.get(key)
+        if m is not None:
+            _map_cache.move_to_end(key)
+            return m
+
+    m = build_map(groups, center, zoom, focus, focus_latlon, manifest)
+    with _map_cache_lock:
+        _map_cache[key] = m
+        if len(_map_cache) > MAP_CACHE_SIZE:
+            _map_cache.popitem(last=False)
+    return m
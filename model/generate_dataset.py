@@ -1,8 +1,7 @@
-import pandas as pd
-import numpy as np
+import argparse
 
-np.random.seed(42)
-N = 350
+import numpy as np
+import pandas as pd
 
 # Defining event attributes
 event_types = ["club", "seminar", "fair", "career_fair"]
@@ -10,49 +9,133 @@ time_of_day = ["morning", "afternoon", "evening"]
 buildings = ["north", "south", "central"]
 day_of_week = ["mon", "tue", "wed", "thu", "fri"]
 
-# Generating random event data
-data = {
-    "event_type": np.random.choice(event_types, N),
-    "time_of_day": np.random.choice(time_of_day, N),
-    "attendance": np.random.randint(10, 300, N),
-    "building_zone": np.random.choice(buildings, N),
-    "day": np.random.choice(day_of_week, N)
+# Defining past-event attributes (building -> zone as in model/past_events.csv)
+campus_buildings = {
+    "Anderson": "east", "Gonda": "east", "UCLA Law": "east",
+    "Boelter Hall": "north", "Engineering VI": "north", "Math Sciences": "north",
+    "Haines Hall": "south", "Kaplan Hall": "south", "Royce Hall": "south",
+    "Hedrick Hall": "west", "Pauley Pavilion": "west", "Sproul Hall": "west",
 }
+event_times = ["09:00", "12:00", "15:00", "18:00", "20:00"]
+
+# Average attendance/RSVP ratios observed in model/past_events.csv
+turnout_base = 0.70
+turnout_event = {"career_fair": 0.045, "club": -0.012, "fair": 0.038, "seminar": -0.047}
+turnout_time = {"09:00": 0.04, "12:00": 0.07, "15:00": 0.045, "18:00": -0.056, "20:00": -0.057}
 
-df = pd.DataFrame(data)
 
-# Calculating surplus label based on event characteristics
-def label_surplus(row):
-    score = 0
+# Calculating surplus labels for a whole chunk at once (same rules as the old per-row loop)
+def label_surplus(df):
+    score = np.zeros(len(df))
     # Applying event type effects
-    if row.event_type == "fair":
-        score += 1.5
-    if row.event_type == "career_fair":
-        score += 1.2
-    if row.event_type == "seminar":
-        score -= 0.5
+    score += np.select(
+        [df["event_type"] == "fair", df["event_type"] == "career_fair", df["event_type"] == "seminar"],
+        [1.5, 1.2, -0.5],
+        0.0,
+    )
     # Applying time of day effects
-    if row.time_of_day == "morning":
-        score -= 0.5
-    if row.time_of_day == "evening":
-        score += 0.5
+    score += np.select([df["time_of_day"] == "morning", df["time_of_day"] == "evening"], [-0.5, 0.5], 0.0)
     # Applying attendance effects
-    if row.attendance < 80:
-        score += 1
-    if row.attendance > 150:
-        score -= 1
+    score += np.select([df["attendance"] < 80, df["attendance"] > 150], [1.0, -1.0], 0.0)
     # Applying building zone effects
-    if row.building_zone == "north":
-        score += 0.3
-    if row.building_zone == "south":
-        score -= 0.2
+    score += np.select([df["building_zone"] == "north", df["building_zone"] == "south"], [0.3, -0.2], 0.0)
     # Applying weekly effects
-    if row.day == "wed":
-        score += 0.3
-    if row.day in ["mon", "fri"]:
-        score -= 0.2
-    return 1 if score > 0.5 else 0
-
-df["surplus"] = df.apply(label_surplus, axis=1)
-df.to_csv("model/dataset.csv", index=False)
-print("WROTE: model/dataset.csv")
+    score += np.select([df["day"] == "wed", df["day"].isin(["mon", "fri"])], [0.3, -0.2], 0.0)
+    return (score > 0.5).astype(int)
+
+
+# Generating one chunk of the surplus classification dataset
+def dataset_chunk(rng, n, start):
+    df = pd.DataFrame({
+        "event_type": rng.choice(event_types, n),
+        "time_of_day": rng.choice(time_of_day, n),
+        "attendance": rng.randint(10, 300, n),
+        "building_zone": rng.choice(buildings, n),
+        "day": rng.choice(day_of_week, n)
+    })
+    df["surplus"] = label_surplus(df)
+    return df
+
+
+# Generating one chunk of past_events.csv-style history for the attendance model
+def past_events_chunk(rng, n, start):
+    names = np.array(list(campus_buildings))
+    building = rng.choice(names, n)
+    zone = pd.Series(building).map(campus_buildings).to_numpy()
+    event_type = rng.choice(event_types, n)
+    time = rng.choice(event_times, n)
+    rsvps = rng.randint(20, 249, n)
+
+    # Turnout ratio = base + event/time effects + noise, as in the historical data
+    ratio = (
+        turnout_base
+        + pd.Series(event_type).map(turnout_event).to_numpy()
+        + pd.Series(time).map(turnout_time).to_numpy()
+        + rng.normal(0, 0.11, n)
+    )
+    attendance = np.clip(np.rint(rsvps * np.clip(ratio, 0.25, 1.0)), 10, rsvps).astype(int)
+    food_ordered = np.floor(rsvps * 1.1).astype(int)
+
+    return pd.DataFrame({
+        "id": np.arange(start + 1, start + n + 1),
+        "building": building,
+        "zone": zone,
+        "event_type": event_type,
+        "day": rng.choice(day_of_week, n),
+        "time": time,
+        "rsvps": rsvps,
+        "expected_attendance": attendance,
+        "food_ordered": food_ordered,
+        "surplus": (food_ordered > attendance + 15).astype(int),
+    })
+
+
+GENERATORS = {"dataset": dataset_chunk, "past_events": past_events_chunk}
+
+# Default outputs; synthetic history never overwrites the real model/past_events.csv
+DEFAULT_OUT = {"dataset": "model/dataset", "past_events": "model/past_events_synthetic"}
+
+
+# Streaming chunks to disk so memory stays bounded for multi-million-row runs
+def generate(kind, rows, out, seed=42, fmt="csv", chunk_size=500_000):
+    rng = np.random.RandomState(seed)
+    chunk_fn = GENERATORS[kind]
+    writer = None
+    try:
+        for start in range(0, rows, chunk_size):
+            df = chunk_fn(rng, min(chunk_size, rows - start), start)
+            if fmt == "csv":
+                df.to_csv(out, mode="w" if start == 0 else "a", header=(start == 0), index=False)
+            else:
+                try:
+                    import pyarrow as pa
+                    import pyarrow.parquet as pq
+                except ImportError:
+                    raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(out, table.schema)
+                writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic FoodLens training data.")
+    parser.add_argument("--kind", choices=sorted(GENERATORS), default="dataset",
+                        help="dataset: surplus classification rows; past_events: attendance history")
+    parser.add_argument("--rows", type=int, default=350)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--chunk-size", type=int, default=500_000)
+    parser.add_argument("--out", help="output path (default: model/dataset.<format> or model/past_events_synthetic.<format>)")
+    args = parser.parse_args()
+
+    out = args.out or f"{DEFAULT_OUT[args.kind]}.{args.format}"
+    generate(args.kind, args.rows, out, seed=args.seed, fmt=args.format, chunk_size=args.chunk_size)
+    print(f"WROTE: {out}")
+
+
+if __name__ == "__main__":
+    main()
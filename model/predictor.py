@@ -1,14 +1,37 @@
+import functools
 import json
-import pandas as pd
-from sklearn.tree import DecisionTreeRegressor
-from sklearn.preprocessing import OneHotEncoder
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-import joblib
+import numpy as np
 import os
+import sys
+import threading
+
+# Allow importing model/ when this file is run as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.tracing import span, traced
+from model.tree_engine import ENGINE_PATH, TABLE_SPEC_PATH, load_engine
+
+FEATURES = ["building","zone","event_type","day","time","rsvps"]
+
+MODEL_PATH = "model/predictor.joblib"
+CONFIG_PATH = "model/predictor_config.json"
+
+# Entries in the per-process memo of single-event predictions
+PREDICTION_CACHE_SIZE = int(os.getenv("FOODLENS_PREDICTION_CACHE", "4096"))
+
+# Process-wide predictor, reloaded only when the artifact on disk changes
+_predictor = {"stamp": None, "bundle": None}
+_predictor_lock = threading.Lock()
 
 # Loading and training predictor model from past events
 def load_predictor():
+    # sklearn is only needed when no exported tree engine is available
+    from sklearn.tree import DecisionTreeRegressor
+    from sklearn.preprocessing import OneHotEncoder
+    from sklearn.compose import ColumnTransformer
+    from sklearn.pipeline import Pipeline
+    import pandas as pd
+
     df = pd.read_csv("model/past_events.csv")
     X = df[["building","zone","event_type","day","time","rsvps"]]
     y_attendance = df["expected_attendance"]
@@ -27,46 +50,216 @@ def load_predictor():
         ("preprocess", preprocess),
         ("tree", DecisionTreeRegressor(max_depth=5, random_state=42))
     ])
-    model.fit(X, y_attendance)
+    with span("model.fit"):
+        model.fit(X, y_attendance)
     return model
 
+class _PipelineModel:
+    """Adapting a fitted sklearn Pipeline to the TreeEngine predict interface."""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def predict(self, data):
+        import pandas as pd
+
+        return self.pipeline.predict(pd.DataFrame(data)[FEATURES])
+
+    def predict_one(self, row):
+        import pandas as pd
+
+        return self.pipeline.predict(pd.DataFrame([row])[FEATURES])[0]
+
+    # The sklearn fallback has no flat node arrays to describe a leaf from
+    def leaf_one(self, row):
+        return None
+
+    def apply(self, data):
+        return None
+
+    def describe_leaf(self, leaf):
+        return None
+
+# Identifying the artifact on disk by modification time and size
+def _artifact_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+# Returning the shared predictor bundle (model, config, version)
+def get_predictor():
+    stamp = (_artifact_stamp(ENGINE_PATH), _artifact_stamp(MODEL_PATH), _artifact_stamp(TABLE_SPEC_PATH))
+    bundle = _predictor["bundle"]
+    if bundle is not None and stamp == _predictor["stamp"]:
+        return bundle
+
+    with _predictor_lock:
+        # Another thread may have reloaded while we waited for the lock
+        if _predictor["bundle"] is not None and stamp == _predictor["stamp"]:
+            return _predictor["bundle"]
+
+        if stamp[0] is not None:
+            # Preferring the flat tree export, which needs neither sklearn nor pandas to predict
+            # (with the memory-mapped lookup table attached when it matches the engine)
+            with span("model.load", kind="io"):
+                engine = load_engine(ENGINE_PATH)
+            bundle = dict(engine.meta, model=engine)
+        elif stamp[1] is not None:
+            import joblib
+
+            with span("model.load", kind="io"):
+                bundle = joblib.load(MODEL_PATH)
+            bundle["model"] = _PipelineModel(bundle["model"])
+        else:
+            # Falling back to in-process training when train_model.py has not been run
+            with open(CONFIG_PATH) as f:
+                cfg = json.load(f)
+            bundle = {"model": _PipelineModel(load_predictor()), "config": cfg, "data_sha256": None, "version": "untracked"}
+
+        _predictor["stamp"] = stamp
+        _predictor["bundle"] = bundle
+        # Predictions from the previous artifact must not outlive it
+        _predict_memo.cache_clear()
+        return bundle
+
+# Memoizing (leaf, attendance) per model version and feature tuple; the UI inputs are small and discrete
+@functools.lru_cache(maxsize=PREDICTION_CACHE_SIZE)
+def _predict_memo(model, version, building, zone, event_type, day, time, rsvps):
+    row = {"building": building, "zone": zone, "event_type": event_type, "day": day, "time": time, "rsvps": rsvps}
+    # Walking the tree once gives both the leaf (for the explanation) and its value
+    leaf = model.leaf_one(row)
+    pred_att = model.predict_one(row) if leaf is None else float(model.value[leaf])
+    return leaf, pred_att
+
+def prediction_cache_info():
+    """Hit/miss counters for the recommend() memo of the current model."""
+    info = _predict_memo.cache_info()
+    lookups = info.hits + info.misses
+    bundle = _predictor["bundle"]
+    return {
+        "version": bundle["version"] if bundle is not None else None,
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+    }
+
 # Generating food recommendation based on event details
+@traced("model.recommend")
 def recommend(building, zone, event_type, day, time, rsvps, planned_food):
-    model = load_predictor()
-
-    # Preparing input data for prediction
-    row = pd.DataFrame([{
-        "building": building,
-        "zone": zone,
-        "event_type": event_type,
-        "day": day,
-        "time": time,
-        "rsvps": rsvps
-    }])
-    pred_att = model.predict(row)[0]
-
-    # Loading configuration parameters
-    with open("model/predictor_config.json") as f:
-        cfg = json.load(f)
+    predictor = get_predictor()
+    model = predictor["model"]
+    cfg = predictor["config"]
+
+    # Predicting from the memo keyed on the model version and the event's features
+    leaf, pred_att = _predict_memo(model, predictor["version"], building, zone, event_type, day, time, rsvps)
 
     # Calculating recommended food quantity
     reco_food = max(rsvps, int(pred_att + cfg["food_buffer"]))
     reduction = planned_food - reco_food
 
-    # Building explanation text
-    explanation = [
-        f"Predicted attendance: ~{int(pred_att)} based on similar past events.",
-        f"RSVPs: {rsvps}. Planned food: {planned_food}.",
-        f"Model recommends ordering {reco_food} to cover buffer while reducing surplus risk."
-    ]
-
     return {
         "predicted_attendance": int(pred_att),
         "recommended_food": int(reco_food),
         "reduction": int(reduction),
-        "explanation": explanation
+        "explanation": explain(int(pred_att), rsvps, planned_food, reco_food, why=model.describe_leaf(leaf))
     }
 
+# Building explanation text for a single recommendation
+def explain(pred_att, rsvps, planned_food, reco_food, why=None):
+    lines = [
+        f"Predicted attendance: ~{pred_att} based on similar past events.",
+        f"RSVPs: {rsvps}. Planned food: {planned_food}.",
+        f"Model recommends ordering {reco_food} to cover buffer while reducing surplus risk."
+    ]
+    if why:
+        lines.insert(1, f"Matched past events where {why}.")
+    return lines
+
+class BatchRecommendation:
+    """Columnar recommendations for many events; explanations are built on demand."""
+
+    def __init__(self, predicted_attendance, recommended_food, reduction, rsvps, planned_food, leaf=None, model=None):
+        self.predicted_attendance = predicted_attendance
+        self.recommended_food = recommended_food
+        self.reduction = reduction
+        self.rsvps = rsvps
+        self.planned_food = planned_food
+        # Leaf per row; rows sharing a leaf share its (cached) path description
+        self.leaf = leaf
+        self.model = model
+
+    def __len__(self):
+        return len(self.predicted_attendance)
+
+    def __getitem__(self, i):
+        # Matching the dict returned by recommend() for a single row
+        return {
+            "predicted_attendance": int(self.predicted_attendance[i]),
+            "recommended_food": int(self.recommended_food[i]),
+            "reduction": int(self.reduction[i]),
+            "explanation": self.explanation(i)
+        }
+
+    def explanation(self, i):
+        return explain(
+            int(self.predicted_attendance[i]),
+            int(self.rsvps[i]),
+            int(self.planned_food[i]),
+            int(self.recommended_food[i]),
+            why=self.model.describe_leaf(self.leaf[i]) if self.leaf is not None else None
+        )
+
+    def explanations(self):
+        for i in range(len(self)):
+            yield self.explanation(i)
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame({
+            "predicted_attendance": self.predicted_attendance,
+            "recommended_food": self.recommended_food,
+            "reduction": self.reduction,
+        })
+
+# Generating food recommendations for many events with a single predict call
+@traced("model.recommend_many")
+def recommend_many(events, planned_food=None):
+    """
+    events: DataFrame (or dict of columns) or iterable of dicts with the recommend() fields.
+    planned_food: optional sequence overriding a "planned_food" column.
+    """
+    if not hasattr(events, "columns"):
+        # Pivoting dicts into columns directly; pandas is not needed for the tree engine
+        rows = list(events)
+        events = {k: [r[k] for r in rows] for k in rows[0]} if rows else {}
+
+    if len(events) == 0 or len(events["rsvps"]) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return BatchRecommendation(empty, empty, empty, empty, empty)
+
+    predictor = get_predictor()
+    cfg = predictor["config"]
+
+    if planned_food is None:
+        planned_food = events["planned_food"]
+    planned = np.asarray(planned_food, dtype=np.int64)
+    rsvps = np.asarray(events["rsvps"], dtype=np.int64)
+
+    model = predictor["model"]
+    leaf = model.apply(events)
+    pred_att = model.predict(events) if leaf is None else model.value[leaf]
+
+    # Calculating recommended food quantities for every row at once
+    reco_food = np.maximum(rsvps, (pred_att + cfg["food_buffer"]).astype(np.int64))
+    reduction = planned - reco_food
+
+    return BatchRecommendation(pred_att.astype(np.int64), reco_food, reduction, rsvps, planned, leaf, model)
+
 if __name__ == "__main__":
     # Running demo prediction
     demo = recommend(
@@ -0,0 +1,250 @@
+"""
+Incremental model refresh from events closed in the app.
+
+Closing an event with an attendance count (deactivate_event(..., attendance=...))
+turns it into a training example. Each refresh pulls only the events closed
+after the stored watermark, appends them to an append-only CSV store
+(model/closed_events.csv) and, once enough new rows have arrived, refits the
+tree on model/past_events.csv plus the store. Artifacts are written through
+train_model's temp-file + os.replace helpers, so the app's predictor picks up
+the new model on its next call (it reloads by file stamp) without ever waiting
+on a fit.
+
+Run it next to the app:
+
+    python model/refresh.py --once              # one pull + refit
+    python model/refresh.py --interval 600      # loop every 10 minutes
+
+or set FOODLENS_REFRESH_INTERVAL (seconds) and call start_refresher() to run
+the same loop in a daemon thread of the current process.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# Allow importing backend/ and model/ when this file is run as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.supabase_client import get_client
+from backend.tracing import span
+
+STORE_PATH = "model/closed_events.csv"
+STATE_PATH = "model/refresh_state.json"
+
+# Seconds between refreshes for start_refresher(); 0 disables the thread
+REFRESH_INTERVAL = float(os.getenv("FOODLENS_REFRESH_INTERVAL", "0"))
+# New closed events needed before a refit is worth it
+REFRESH_MIN_ROWS = int(os.getenv("FOODLENS_REFRESH_MIN_ROWS", "1"))
+
+STORE_COLUMNS = ["event_id", "closed_at", "building", "zone", "event_type", "day", "time", "rsvps", "expected_attendance"]
+
+# Event time slots used in past_events.csv
+TIME_SLOTS = ["09:00", "12:00", "15:00", "18:00", "20:00"]
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+CAMPUS_TZ = ZoneInfo("America/Los_Angeles")
+
+_PULL_COLUMNS = "id,building,zone,event_type,created_at,closed_at,rsvps,attendance"
+
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"watermark": None, "store_rows": 0, "pending_rows": 0, "version": None}
+
+
+def save_state(state, path=STATE_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# Turning a closed event into a past_events.csv-style training row
+def to_training_row(event):
+    created = datetime.fromisoformat(event["created_at"].replace("Z", "+00:00"))
+    if created.tzinfo is not None:
+        created = created.astimezone(CAMPUS_TZ)
+    minutes = created.hour * 60 + created.minute
+    slot = min(TIME_SLOTS, key=lambda t: abs(int(t[:2]) * 60 - minutes))
+    return {
+        "event_id": event["id"],
+        "closed_at": event["closed_at"],
+        "building": event.get("building"),
+        "zone": event.get("zone"),
+        "event_type": event.get("event_type"),
+        "day": DAYS[created.weekday()],
+        "time": slot,
+        "rsvps": int(event["rsvps"]),
+        "expected_attendance": int(event["attendance"]),
+    }
+
+
+def pull_closed(watermark=None, page_size=1000):
+    """
+    Closed events with an attendance count, oldest first, after watermark.
+
+    watermark is a [closed_at, id] keyset, so events closed in the same instant
+    are neither skipped nor pulled twice across page boundaries. A bare
+    closed_at string (state files from before the keyset) is read as "after
+    that instant".
+    """
+    rows = []
+    while True:
+        query = get_client().table("events").select(_PULL_COLUMNS).eq("is_active", False)
+        if isinstance(watermark, str):
+            query = query.gt("closed_at", watermark)
+        elif watermark is not None:
+            closed_at, event_id = watermark
+            query = query.or_(
+                f'closed_at.gt."{closed_at}",and(closed_at.eq."{closed_at}",id.gt."{event_id}")'
+            )
+        page = query.order("closed_at").order("id").limit(page_size).execute().data or []
+        for event in page:
+            if event.get("closed_at") and event.get("attendance") is not None and event.get("rsvps") is not None:
+                rows.append(to_training_row(event))
+        if len(page) < page_size:
+            return rows
+        watermark = [page[-1]["closed_at"], page[-1]["id"]]
+
+
+# Appending new rows to the store; existing rows are never rewritten
+def append_store(rows, path=STORE_PATH):
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=STORE_COLUMNS)
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def refit(store_path=STORE_PATH):
+    """Refit on past_events.csv + the closed-event store and swap the served artifacts."""
+    # Training dependencies are only imported by the refresh worker
+    import pandas as pd
+
+    from model.train_model import (
+        CONFIG_PATH, DATA_PATH, DEFAULT_CONFIG, FEATURES, TREE_PARAMS, build_pipeline, export_engine,
+        export_table, export_tree_json, file_sha256, save_artifact, tree_arrays,
+    )
+    from sklearn.tree import export_text
+
+    frames = [pd.read_csv(DATA_PATH, usecols=FEATURES + ["expected_attendance"])]
+    if os.path.exists(store_path):
+        frames.append(pd.read_csv(store_path, usecols=FEATURES + ["expected_attendance"]))
+    df = pd.concat(frames, ignore_index=True)
+
+    # Keeping the tuned tree shape and food buffer from the last train_model.py run
+    try:
+        with open(CONFIG_PATH) as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        config = dict(DEFAULT_CONFIG)
+    params = {k: config.get(k, DEFAULT_CONFIG[k]) for k in TREE_PARAMS}
+
+    model = build_pipeline(**params)
+    with span("model.fit"):
+        model.fit(df[FEATURES], df["expected_attendance"])
+
+    # Versioning by both inputs so refreshed artifacts trace back to their data
+    h = hashlib.sha256(file_sha256(DATA_PATH).encode())
+    if os.path.exists(store_path):
+        h.update(file_sha256(store_path).encode())
+    bundle = save_artifact(model, config, h.hexdigest())
+
+    arrays = tree_arrays(model)
+    meta = {"config": config, "data_sha256": bundle["data_sha256"], "version": bundle["version"]}
+    text = export_text(
+        model.named_steps["tree"],
+        feature_names=list(model.named_steps["preprocess"].get_feature_names_out()),
+    )
+    export_table(arrays, meta)
+    export_engine(arrays, meta)
+    export_tree_json(arrays, meta, text)
+    return bundle["version"], len(df)
+
+
+_refresh_lock = threading.Lock()
+
+
+def refresh_once(min_rows=REFRESH_MIN_ROWS, store_path=STORE_PATH, state_path=STATE_PATH):
+    """Pull newly closed events and refit when enough have accumulated. Returns the updated state."""
+    with _refresh_lock:
+        state = load_state(state_path)
+        rows = pull_closed(state["watermark"])
+        if rows:
+            append_store(rows, store_path)
+            state["watermark"] = [rows[-1]["closed_at"], rows[-1]["event_id"]]
+            state["store_rows"] += len(rows)
+            state["pending_rows"] += len(rows)
+            save_state(state, state_path)
+
+        if state["pending_rows"] >= max(min_rows, 1):
+            start = time.perf_counter()
+            version, n = refit(store_path)
+            state.update(
+                version=version,
+                pending_rows=0,
+                trained_rows=n,
+                trained_at=datetime.now().astimezone().isoformat(),
+                fit_seconds=round(time.perf_counter() - start, 3),
+            )
+            save_state(state, state_path)
+        state["pulled"] = len(rows)
+        return state
+
+
+def _run(interval, min_rows):
+    while True:
+        try:
+            refresh_once(min_rows)
+        except Exception as e:
+            # A failed refresh leaves the served model untouched; try again next round
+            print(f"Model refresh failed: {e}", file=sys.stderr)
+        time.sleep(interval)
+
+
+_refresher = None
+
+
+def start_refresher(interval=REFRESH_INTERVAL, min_rows=REFRESH_MIN_ROWS):
+    """Start the refresh loop in a daemon thread (no-op when interval <= 0 or already running)."""
+    global _refresher
+    if interval <= 0:
+        return None
+    with _refresh_lock:
+        if _refresher is None:
+            _refresher = threading.Thread(target=_run, args=(interval, min_rows), name="foodlens-refresh", daemon=True)
+            _refresher.start()
+    return _refresher
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the attendance model from closed events.")
+    parser.add_argument("--once", action="store_true", help="run a single pull + refit and exit")
+    parser.add_argument("--interval", type=float, default=REFRESH_INTERVAL or 600, help="seconds between refreshes")
+    parser.add_argument("--min-rows", type=int, default=REFRESH_MIN_ROWS, help="new rows needed to refit")
+    args = parser.parse_args()
+
+    if args.once:
+        state = refresh_once(args.min_rows)
+        print(f"Pulled {state['pulled']} closed events; store has {state['store_rows']}; model {state['version']}")
+        return
+    while True:
+        state = refresh_once(args.min_rows)
+        print(f"Pulled {state['pulled']} closed events; store has {state['store_rows']}; model {state['version']}")
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
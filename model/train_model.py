@@ -5,59 +5,313 @@ from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import accuracy_score
 from sklearn.tree import export_text
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import hashlib
+import itertools
+import joblib
 import json
+import numpy as np
+import os
+import sys
+import time
 
-# Loading past events dataset
-df = pd.read_csv("model/past_events.csv")
-
-# Preparing features and target for attendance prediction
-X = df[["building","zone","event_type","day","time","rsvps"]]
-y_attendance = df["expected_attendance"]
-
-# Defining categorical and numerical features
-categorical = ["building","zone","event_type","day","time"]
-numerical = ["rsvps"]
-
-# Creating preprocessing pipeline with one-hot encoding
-preprocess = ColumnTransformer(
-    transformers=[
-        ("cat", OneHotEncoder(handle_unknown="ignore"), categorical),
-        ("num", "passthrough", numerical),
-    ]
-)
-
-# Building attendance prediction model
-attendance_model = Pipeline(steps=[
-    ("preprocess", preprocess),
-    ("tree", DecisionTreeRegressor(max_depth=5, random_state=42))
-])
-
-# Training the model
-attendance_model.fit(X, y_attendance)
-
-# Evaluating model performance on training data
-pred_att = attendance_model.predict(X)
-# Deriving surplus classification from predicted attendance
-food_ordered = df["rsvps"] * 1.1
-y_surplus = (food_ordered > df["expected_attendance"] + 15).astype(int)
-pred_surplus = (food_ordered > pred_att + 15).astype(int)
-acc = accuracy_score(y_surplus, pred_surplus)
-print("Surplus classification accuracy:", round(acc, 3))
-
-# Exporting decision tree as readable text
-tree_text = export_text(
-    attendance_model.named_steps["tree"],
-    feature_names=list(attendance_model.named_steps["preprocess"].get_feature_names_out()),
-    max_depth=5
-)
-
-# Saving tree structure to JSON
-with open("model/predictor_tree.json","w") as f:
-    json.dump({"tree": tree_text}, f, indent=2)
-print("WROTE: model/predictor_tree.json")
-
-# Saving predictor configuration
-config = {"food_buffer": 15, "extra_percent": 0.1}
-with open("model/predictor_config.json","w") as f:
-    json.dump(config,f,indent=2)
-print("WROTE: model/predictor_config.json")
+# Allow importing model/ when this file is run as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+DATA_PATH = "model/past_events.csv"
+MODEL_PATH = "model/predictor.joblib"
+ENGINE_PATH = "model/predictor_tree.npz"
+TREE_PATH = "model/predictor_tree.json"
+TABLE_PATH = "model/predictor_table.npy"
+TABLE_SPEC_PATH = "model/predictor_table.json"
+CONFIG_PATH = "model/predictor_config.json"
+
+FEATURES = ["building","zone","event_type","day","time","rsvps"]
+CATEGORICAL = ["building","zone","event_type","day","time"]
+NUMERICAL = ["rsvps"]
+
+# Tree shape is stored with the buffer so model/refresh.py refits with the tuned parameters
+DEFAULT_CONFIG = {"food_buffer": 15, "extra_percent": 0.1, "max_depth": 5, "min_samples_leaf": 1}
+TREE_PARAMS = ["max_depth", "min_samples_leaf"]
+
+# Default search grid (override with --depths/--min-leaf/--buffers)
+SEARCH_DEPTHS = [3, 4, 5, 6, 8, 10]
+SEARCH_MIN_LEAF = [1, 2, 5, 10, 20]
+SEARCH_BUFFERS = list(range(0, 31, 5))
+
+
+# Building the attendance prediction pipeline with one-hot encoding
+def build_pipeline(max_depth=5, min_samples_leaf=1):
+    preprocess = ColumnTransformer(
+        transformers=[
+            ("cat", OneHotEncoder(handle_unknown="ignore"), CATEGORICAL),
+            ("num", "passthrough", NUMERICAL),
+        ]
+    )
+    return Pipeline(steps=[
+        ("preprocess", preprocess),
+        ("tree", DecisionTreeRegressor(max_depth=max_depth, min_samples_leaf=min_samples_leaf, random_state=42))
+    ])
+
+
+# Hashing the training CSV so artifacts can be traced back to their data
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# Writing the fitted model bundle atomically so readers never see a partial file
+def save_artifact(model, config, data_hash, path=MODEL_PATH):
+    bundle = {
+        "model": model,
+        "config": config,
+        "data_sha256": data_hash,
+        "version": data_hash[:12] + "-" + str(int(time.time())),
+    }
+    tmp_path = path + ".tmp"
+    joblib.dump(bundle, tmp_path)
+    os.replace(tmp_path, path)
+    return bundle
+
+
+# Flattening the fitted pipeline into node arrays keyed by raw input column
+def tree_arrays(model):
+    encoder = model.named_steps["preprocess"].named_transformers_["cat"]
+    names = list(model.named_steps["preprocess"].get_feature_names_out())
+    tree = model.named_steps["tree"].tree_
+
+    # Mapping each encoded column back to (raw column, category code)
+    encoded = []
+    for col, cats in zip(CATEGORICAL, encoder.categories_):
+        encoded += [(FEATURES.index(col), code) for code in range(len(cats))]
+    encoded += [(FEATURES.index(col), -1) for col in NUMERICAL]
+
+    is_leaf = tree.children_left == -1
+    feature_column = np.array([-1 if leaf else encoded[f][0] for f, leaf in zip(tree.feature, is_leaf)])
+    feature_category = np.array([-1 if leaf else encoded[f][1] for f, leaf in zip(tree.feature, is_leaf)])
+
+    arrays = {
+        "columns": np.array(FEATURES),
+        "categorical": np.array(CATEGORICAL),
+        "feature_name": np.array(["" if leaf else names[f] for f, leaf in zip(tree.feature, is_leaf)]),
+        "feature_column": feature_column.astype(np.int32),
+        "feature_category": feature_category.astype(np.int32),
+        "threshold": tree.threshold.astype(np.float64),
+        "left": tree.children_left.astype(np.int32),
+        "right": tree.children_right.astype(np.int32),
+        "samples": tree.n_node_samples.astype(np.int32),
+        "value": tree.value[:, 0, 0].astype(np.float64),
+    }
+    for col, cats in zip(CATEGORICAL, encoder.categories_):
+        arrays["vocab_" + col] = np.array([str(c) for c in cats])
+    return arrays
+
+
+# Writing flat arrays the NumPy tree engine can load without sklearn
+def export_engine(arrays, meta, path=ENGINE_PATH):
+    arrays = dict(arrays, meta=np.array(json.dumps(meta)))
+    # Writing through a temp file (np.savez appends .npz to bare names)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+# Writing the same tree as machine-readable JSON node arrays (plus the text rendering)
+def export_tree_json(arrays, meta, text, path=TREE_PATH):
+    columns = [str(c) for c in arrays["columns"]]
+    vocab = {str(c): [str(v) for v in arrays["vocab_" + str(c)]] for c in arrays["categorical"]}
+    leaf = arrays["left"] == -1
+    column = [None if l else columns[c] for c, l in zip(arrays["feature_column"], leaf)]
+    nodes = {
+        "feature": [None if l else str(f) for f, l in zip(arrays["feature_name"], leaf)],
+        "column": column,
+        "category": [
+            vocab[col][c] if col is not None and c >= 0 else None
+            for col, c in zip(column, arrays["feature_category"])
+        ],
+        "threshold": [None if l else float(t) for t, l in zip(arrays["threshold"], leaf)],
+        "left": arrays["left"].tolist(),
+        "right": arrays["right"].tolist(),
+        "samples": arrays["samples"].tolist(),
+        "value": arrays["value"].tolist(),
+    }
+    doc = {"format": "foodlens-tree/1", **meta, "columns": columns, "vocab": vocab, "nodes": nodes, "tree": text}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(doc, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# Scoring food orders the way recommend() places them: waste plus weighted shortfall per event
+def food_cost(pred_att, rsvps, attendance, buffer, shortfall_cost):
+    reco = np.maximum(rsvps, (pred_att + buffer).astype(np.int64))
+    waste = np.clip(reco - attendance, 0, None)
+    shortfall = np.clip(attendance - reco, 0, None)
+    return float((waste + shortfall_cost * shortfall).mean())
+
+
+# Encoded features shared by every search task in a worker process
+_search_data = {}
+
+
+def _init_search_worker(X, y, folds):
+    _search_data["X"] = X
+    _search_data["y"] = y
+    _search_data["folds"] = folds
+
+
+# Fitting one (depth, min_samples_leaf) candidate on every fold and returning out-of-fold predictions
+def _fit_candidate(max_depth, min_samples_leaf):
+    start = time.perf_counter()
+    X, y, folds = _search_data["X"], _search_data["y"], _search_data["folds"]
+    oof = np.empty(len(y))
+    for k in range(folds.max() + 1):
+        test = folds == k
+        tree = DecisionTreeRegressor(max_depth=max_depth, min_samples_leaf=min_samples_leaf, random_state=42)
+        tree.fit(X[~test], y[~test])
+        oof[test] = tree.predict(X[test])
+    return max_depth, min_samples_leaf, oof, time.perf_counter() - start
+
+
+# Writing the dense (categories x rsvps bin) leaf table next to its JSON sidecar
+def export_table(arrays, meta, path=TABLE_PATH, spec_path=TABLE_SPEC_PATH):
+    from model.tree_engine import TreeEngine, build_table
+
+    leaves, spec = build_table(TreeEngine(arrays, meta))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, leaves)
+    os.replace(tmp_path, path)
+    tmp_path = spec_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(spec, f)
+    os.replace(tmp_path, spec_path)
+    return leaves
+
+
+def search(df, depths=SEARCH_DEPTHS, min_leaf=SEARCH_MIN_LEAF, buffers=SEARCH_BUFFERS,
+           n_folds=5, workers=None, shortfall_cost=3.0, seed=42):
+    """
+    Cross-validated grid search over tree shape, then food buffer.
+
+    Features are one-hot encoded once and handed to each worker process by the
+    pool initializer, so candidates only pay for tree fits. The tree shape is
+    chosen by out-of-fold MAE; the food buffer is then chosen by food cost on
+    that tree's out-of-fold predictions (costs barely separate tree shapes,
+    since recommendations are floored at RSVPs). Returns the candidates sorted
+    by cv_mae, best first; the best one also carries food_buffer, cost and
+    buffer_costs.
+    """
+    encoder = build_pipeline().named_steps["preprocess"]
+    X = np.asarray(encoder.fit_transform(df[FEATURES]).toarray(), dtype=np.float32)
+    y = df["expected_attendance"].to_numpy(dtype=np.float64)
+    rsvps = df["rsvps"].to_numpy(dtype=np.int64)
+    folds = np.random.RandomState(seed).permutation(len(df)) % n_folds
+
+    results = []
+    oofs = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_search_worker, initargs=(X, y, folds)) as pool:
+        futures = [pool.submit(_fit_candidate, d, m) for d, m in itertools.product(depths, min_leaf)]
+        for future in as_completed(futures):
+            depth, leaf, oof, seconds = future.result()
+            mae = float(np.abs(oof - y).mean())
+            print(f"depth={depth:<3} min_leaf={leaf:<3} {seconds * 1000:8.1f} ms  cv_mae={mae:6.2f}")
+            oofs[(depth, leaf)] = oof
+            results.append({"max_depth": depth, "min_samples_leaf": leaf, "cv_mae": mae, "seconds": seconds})
+
+    # Ties on MAE go to the simpler tree
+    results.sort(key=lambda r: (r["cv_mae"], r["max_depth"], -r["min_samples_leaf"]))
+    best = results[0]
+    oof = oofs[(best["max_depth"], best["min_samples_leaf"])]
+    costs = {b: food_cost(oof, rsvps, y, b, shortfall_cost) for b in buffers}
+    best["buffer_costs"] = costs
+    best["food_buffer"] = min(costs, key=lambda b: (costs[b], b))
+    best["cost"] = costs[best["food_buffer"]]
+    return results
+
+
+def parse_ints(text):
+    return [int(v) for v in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the FoodLens attendance model.")
+    parser.add_argument("--search", action="store_true", help="cross-validated grid search before the final fit")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--workers", type=int, help="search processes (default: all cores)")
+    parser.add_argument("--depths", type=parse_ints, default=SEARCH_DEPTHS)
+    parser.add_argument("--min-leaf", type=parse_ints, default=SEARCH_MIN_LEAF)
+    parser.add_argument("--buffers", type=parse_ints, default=SEARCH_BUFFERS)
+    parser.add_argument("--shortfall-cost", type=float, default=3.0,
+                        help="cost of one missing portion relative to one wasted portion")
+    args = parser.parse_args()
+
+    # Loading past events dataset
+    df = pd.read_csv(DATA_PATH)
+
+    # Preparing features and target for attendance prediction
+    X = df[FEATURES]
+    y_attendance = df["expected_attendance"]
+
+    config = dict(DEFAULT_CONFIG)
+    params = {k: config[k] for k in TREE_PARAMS}
+    if args.search:
+        start = time.perf_counter()
+        results = search(df, args.depths, args.min_leaf, args.buffers, n_folds=args.folds,
+                         workers=args.workers, shortfall_cost=args.shortfall_cost)
+        best = results[0]
+        print(f"Search: {len(results)} trees x {len(args.buffers)} buffers in {time.perf_counter() - start:.1f}s")
+        print(f"Best: depth={best['max_depth']} min_leaf={best['min_samples_leaf']} "
+              f"food_buffer={best['food_buffer']} cv_mae={best['cv_mae']:.2f} cost={best['cost']:.2f}")
+        params = {k: best[k] for k in TREE_PARAMS}
+        config.update(params, food_buffer=best["food_buffer"])
+
+    # Training the model
+    attendance_model = build_pipeline(**params)
+    attendance_model.fit(X, y_attendance)
+
+    # Evaluating model performance on training data
+    pred_att = attendance_model.predict(X)
+    # Deriving surplus classification from predicted attendance
+    food_ordered = df["rsvps"] * 1.1
+    y_surplus = (food_ordered > df["expected_attendance"] + 15).astype(int)
+    pred_surplus = (food_ordered > pred_att + 15).astype(int)
+    acc = accuracy_score(y_surplus, pred_surplus)
+    print("Surplus classification accuracy:", round(acc, 3))
+
+    # Exporting decision tree as readable text
+    tree_text = export_text(
+        attendance_model.named_steps["tree"],
+        feature_names=list(attendance_model.named_steps["preprocess"].get_feature_names_out()),
+        max_depth=params["max_depth"]
+    )
+
+    # Saving predictor configuration
+    with open(CONFIG_PATH,"w") as f:
+        json.dump(config,f,indent=2)
+    print("WROTE:", CONFIG_PATH)
+
+    # Saving the fitted model so the app only pays for inference
+    bundle = save_artifact(attendance_model, config, file_sha256(DATA_PATH))
+    print("WROTE:", MODEL_PATH, "(version", bundle["version"] + ")")
+
+    # Exporting flat tree arrays so the web process can skip sklearn entirely
+    arrays = tree_arrays(attendance_model)
+    meta = {"config": config, "data_sha256": bundle["data_sha256"], "version": bundle["version"]}
+    # Writing the table first so a reloading predictor finds it already matching the new engine
+    leaves = export_table(arrays, meta)
+    print("WROTE:", TABLE_PATH, f"({leaves.nbytes // 1024} KiB)")
+    export_engine(arrays, meta)
+    print("WROTE:", ENGINE_PATH)
+
+    # Saving tree structure to JSON (node arrays for tools, text for humans)
+    export_tree_json(arrays, meta, tree_text)
+    print("WROTE:", TREE_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Pure-NumPy inference for the exported attendance tree.
+
+train_model.py flattens the fitted DecisionTreeRegressor and the one-hot
+vocabularies into predictor_tree.npz (and the same node arrays, with names,
+into predictor_tree.json). Each split node stores the raw input column it
+tests and, for categorical columns, the category code whose one-hot indicator
+the original tree compared against its threshold. Walking these arrays
+reproduces Pipeline.predict exactly without sklearn, sparse matrices or
+DataFrame validation, and the path to a leaf doubles as its explanation.
+
+Because the tree only splits rsvps at a few thresholds, the whole input space
+also fits in a dense table: one leaf id per (categorical combination, rsvps
+bin), with an extra "unknown" slot per categorical column. train_model.py saves
+it as predictor_table.npy (+ a .json sidecar); load_engine() memory-maps it so
+every Streamlit worker process shares one copy of the pages, and single-row
+lookups become a dict lookup per column plus a binary search.
+"""
+import bisect
+import json
+
+import numpy as np
+
+ENGINE_PATH = "model/predictor_tree.npz"
+TREE_JSON_PATH = "model/predictor_tree.json"
+TABLE_PATH = "model/predictor_table.npy"
+TABLE_SPEC_PATH = "model/predictor_table.json"
+
+LEAF = -1
+
+
+class TreeEngine:
+    def __init__(self, arrays, meta=None):
+        self.columns = [str(c) for c in arrays["columns"]]
+        self.categorical = [str(c) for c in arrays["categorical"]]
+        self.vocab = {c: np.asarray(arrays["vocab_" + c]) for c in self.categorical}
+        self.meta = meta if meta is not None else json.loads(str(arrays["meta"]))
+
+        self.feature_column = np.asarray(arrays["feature_column"], dtype=np.int64)
+        self.feature_category = np.asarray(arrays["feature_category"], dtype=np.int64)
+        self.threshold = np.asarray(arrays["threshold"], dtype=np.float64)
+        self.left = np.asarray(arrays["left"], dtype=np.int64)
+        self.right = np.asarray(arrays["right"], dtype=np.int64)
+        self.value = np.asarray(arrays["value"], dtype=np.float64)
+        self.is_categorical = self.feature_category >= 0
+        self.samples = np.asarray(arrays["samples"]) if "samples" in arrays else None
+
+        # Parent pointers let a leaf's path be rebuilt in O(depth)
+        self.parent = np.full(len(self.left), LEAF, dtype=np.int64)
+        internal = np.flatnonzero(self.left != LEAF)
+        self.parent[self.left[internal]] = internal
+        self.parent[self.right[internal]] = internal
+        self._leaf_text = {}
+        # Dense leaf lookup table, attached by load_engine() when its version matches
+        self.table = None
+
+        # Plain Python copies make the single-row walk avoid NumPy scalar overhead
+        self._nodes = list(zip(
+            self.feature_column.tolist(),
+            self.feature_category.tolist(),
+            self.threshold.tolist(),
+            self.left.tolist(),
+            self.right.tolist(),
+            self.value.tolist(),
+        ))
+        self._codes = {c: {v: i for i, v in enumerate(self.vocab[c].tolist())} for c in self.categorical}
+
+    # Encoding one input row into per-column codes (categorical) or float32 values (numeric)
+    def _encode_one(self, row):
+        x = []
+        for c in self.columns:
+            if c in self._codes:
+                # Unknown categories map to -1, matching handle_unknown="ignore"
+                x.append(self._codes[c].get(row[c], -1))
+            else:
+                # sklearn trees compare float32 inputs against float64 thresholds
+                x.append(float(np.float32(row[c])))
+        return x
+
+    def leaf_one(self, row):
+        if self.table is not None:
+            return self.table.leaf_one(row)
+        x = self._encode_one(row)
+        node = 0
+        while True:
+            col, cat, thr, left, right, value = self._nodes[node]
+            if left == LEAF:
+                return node
+            v = x[col]
+            if cat >= 0:
+                v = 1.0 if v == cat else 0.0
+            node = left if v <= thr else right
+
+    def predict_one(self, row):
+        return self._nodes[self.leaf_one(row)][5]
+
+    def decision_path(self, leaf):
+        """Nodes from the root down to leaf."""
+        path = []
+        node = int(leaf)
+        while node != LEAF:
+            path.append(node)
+            node = int(self.parent[node])
+        return path[::-1]
+
+    def path_conditions(self, leaf):
+        """Split conditions on the way to leaf, merged per input column."""
+        bounds = {}
+        path = self.decision_path(leaf)
+        for node, child in zip(path, path[1:]):
+            col = self.columns[self.feature_column[node]]
+            went_left = child == self.left[node]
+            thr = float(self.threshold[node])
+            cond = bounds.setdefault(col, {"low": None, "high": None, "is": None, "not": []})
+            if self.is_categorical[node]:
+                category = str(self.vocab[col][self.feature_category[node]])
+                # The one-hot indicator is 0 on the left branch and 1 on the right
+                if went_left:
+                    cond["not"].append(category)
+                else:
+                    cond["is"] = category
+            elif went_left:
+                cond["high"] = thr if cond["high"] is None else min(cond["high"], thr)
+            else:
+                cond["low"] = thr if cond["low"] is None else max(cond["low"], thr)
+
+        parts = []
+        for col, cond in bounds.items():
+            if cond["is"] is not None:
+                parts.append(f"{col} is {cond['is']}")
+            elif cond["not"]:
+                parts.append(f"{col} is not {' or '.join(cond['not'])}")
+            if cond["low"] is not None and cond["high"] is not None:
+                parts.append(f"{cond['low']:g} < {col} <= {cond['high']:g}")
+            elif cond["low"] is not None:
+                parts.append(f"{col} > {cond['low']:g}")
+            elif cond["high"] is not None:
+                parts.append(f"{col} <= {cond['high']:g}")
+        return parts
+
+    def describe_leaf(self, leaf):
+        """One-line "why" for every input that lands in leaf (cached per leaf)."""
+        leaf = int(leaf)
+        text = self._leaf_text.get(leaf)
+        if text is None:
+            text = ", ".join(self.path_conditions(leaf)) or "all past events"
+            if self.samples is not None:
+                text += f" ({int(self.samples[leaf])} past events, avg attendance {self.value[leaf]:.0f})"
+            self._leaf_text[leaf] = text
+        return text
+
+    # Encoding a batch of rows into a (n_rows, n_columns) float64 matrix
+    def encode(self, data):
+        n = len(data[self.columns[0]])
+        X = np.empty((n, len(self.columns)), dtype=np.float64)
+        for j, c in enumerate(self.columns):
+            values = np.asarray(data[c])
+            if c in self.vocab:
+                vocab = self.vocab[c]
+                values = values.astype(str)
+                # Vocabularies are sorted (OneHotEncoder.categories_), so searchsorted finds codes
+                codes = np.searchsorted(vocab, values)
+                codes = np.minimum(codes, len(vocab) - 1)
+                X[:, j] = np.where(vocab[codes] == values, codes, -1)
+            else:
+                X[:, j] = values.astype(np.float32)
+        return X
+
+    def apply(self, data):
+        if self.table is not None and not isinstance(data, np.ndarray):
+            return self.table.apply(data)
+        X = data if isinstance(data, np.ndarray) else self.encode(data)
+        rows = np.arange(len(X))
+        node = np.zeros(len(X), dtype=np.int64)
+        active = self.left[node] != LEAF
+        while active.any():
+            r = rows[active]
+            n = node[active]
+            v = X[r, self.feature_column[n]]
+            v = np.where(self.is_categorical[n], (v == self.feature_category[n]).astype(np.float64), v)
+            node[active] = np.where(v <= self.threshold[n], self.left[n], self.right[n])
+            active = self.left[node] != LEAF
+        return node
+
+    def predict(self, data):
+        return self.value[self.apply(data)]
+
+
+def load_engine(path=ENGINE_PATH, table_path=TABLE_PATH):
+    with np.load(path, allow_pickle=False) as arrays:
+        engine = TreeEngine(arrays)
+    if table_path is not None:
+        table = load_table(table_path)
+        # A table left over from an older model is ignored rather than trusted
+        if table is not None and table.version == engine.meta.get("version"):
+            engine.table = table
+    return engine
+
+
+class LookupTable:
+    """Leaf id for every (categorical codes..., rsvps bin) cell of the input space."""
+
+    def __init__(self, leaves, spec):
+        self.leaves = leaves
+        self.version = spec["version"]
+        self.categorical = spec["categorical"]
+        self.numeric = spec["numeric"]
+        self.vocab = {c: np.asarray(spec["vocab"][c]) for c in self.categorical}
+        self.breakpoints = np.asarray(spec["breakpoints"], dtype=np.float64)
+        self._breakpoints = self.breakpoints.tolist()
+        self._codes = {c: {v: i for i, v in enumerate(spec["vocab"][c])} for c in self.categorical}
+        # Flat offsets per axis so a single lookup is one .item() call on the mapped buffer
+        self._flat = leaves.reshape(-1)
+        strides = np.cumprod((leaves.shape[1:] + (1,))[::-1])[::-1].tolist()
+        self._axes = [(c, self._codes[c], len(self._codes[c]), stride) for c, stride in zip(self.categorical, strides)]
+
+    def leaf_one(self, row):
+        offset = 0
+        for c, codes, unknown, stride in self._axes:
+            # Unknown categories use the extra last slot of their axis
+            offset += codes.get(row[c], unknown) * stride
+        # Bin i holds values in (breakpoints[i-1], breakpoints[i]], matching "v <= threshold" going left
+        v = row[self.numeric]
+        if not isinstance(v, int):
+            # Integers (RSVP counts) are exact in float32; other values take the tree's float32 rounding
+            v = float(np.float32(v))
+        return self._flat.item(offset + bisect.bisect_left(self._breakpoints, v))
+
+    def apply(self, data):
+        index = []
+        for c in self.categorical:
+            vocab = self.vocab[c]
+            values = np.asarray(data[c]).astype(str)
+            codes = np.minimum(np.searchsorted(vocab, values), len(vocab) - 1)
+            index.append(np.where(vocab[codes] == values, codes, len(vocab)))
+        values = np.asarray(data[self.numeric]).astype(np.float32).astype(np.float64)
+        index.append(np.searchsorted(self.breakpoints, values, side="left"))
+        return self.leaves[tuple(index)].astype(np.int64)
+
+
+# Enumerating every cell of the input space through the engine's own walk
+def build_table(engine):
+    numeric = [c for c in engine.columns if c not in engine.vocab]
+    if len(numeric) != 1:
+        raise ValueError(f"Lookup table needs exactly one numeric column, got {numeric}")
+    numeric = numeric[0]
+    num_col = engine.columns.index(numeric)
+
+    splits = (engine.left != LEAF) & (engine.feature_column == num_col) & ~engine.is_categorical
+    breakpoints = np.unique(engine.threshold[splits])
+    # One representative value per bin: each breakpoint itself, then one past the last
+    representatives = np.append(breakpoints, breakpoints[-1] + 1 if len(breakpoints) else 0.0)
+
+    sizes = [len(engine.vocab[c]) + 1 for c in engine.categorical]
+    shape = tuple(sizes) + (len(representatives),)
+    grid = np.indices(shape).reshape(len(shape), -1)
+
+    X = np.empty((grid.shape[1], len(engine.columns)), dtype=np.float64)
+    for axis, c in enumerate(engine.categorical):
+        codes = grid[axis]
+        X[:, engine.columns.index(c)] = np.where(codes == sizes[axis] - 1, -1, codes)
+    X[:, num_col] = representatives[grid[-1]]
+
+    dtype = np.int16 if len(engine.left) < np.iinfo(np.int16).max else np.int32
+    leaves = engine.apply(X).astype(dtype).reshape(shape)
+    spec = {
+        "format": "foodlens-table/1",
+        "version": engine.meta.get("version"),
+        "categorical": engine.categorical,
+        "numeric": numeric,
+        "vocab": {c: engine.vocab[c].tolist() for c in engine.categorical},
+        "breakpoints": breakpoints.tolist(),
+        "shape": list(shape),
+    }
+    return leaves, spec
+
+
+def load_table(path=TABLE_PATH, spec_path=TABLE_SPEC_PATH):
+    try:
+        with open(spec_path) as f:
+            spec = json.load(f)
+        # Memory-mapped so processes serving the same artifact share its pages
+        leaves = np.load(path, mmap_mode="r", allow_pickle=False)
+    except FileNotFoundError:
+        return None
+    return LookupTable(leaves, spec)
+
+
+# Building the engine from the structured predictor_tree.json node arrays
+def load_tree_json(path=TREE_JSON_PATH):
+    with open(path) as f:
+        doc = json.load(f)
+    nodes = doc["nodes"]
+    columns = doc["columns"]
+    codes = {c: {v: i for i, v in enumerate(vocab)} for c, vocab in doc["vocab"].items()}
+    arrays = {
+        "columns": np.array(columns),
+        "categorical": np.array(list(doc["vocab"])),
+        "feature_column": [LEAF if c is None else columns.index(c) for c in nodes["column"]],
+        "feature_category": [
+            codes[c][v] if v is not None else LEAF for c, v in zip(nodes["column"], nodes["category"])
+        ],
+        "threshold": [-2.0 if t is None else t for t in nodes["threshold"]],
+        "left": nodes["left"],
+        "right": nodes["right"],
+        "samples": nodes["samples"],
+        "value": nodes["value"],
+    }
+    for c, vocab in doc["vocab"].items():
+        arrays["vocab_" + c] = np.array(vocab)
+    meta = {k: doc[k] for k in ("config", "data_sha256", "version") if k in doc}
+    return TreeEngine(arrays, meta)
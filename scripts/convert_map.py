@@ -1,59 +1,263 @@
 #!/usr/bin/env python3
 """
-Converting PDF map to PNG image.
+Converting the campus PDF map to a z/x/y tile pyramid for the Browse map.
+
+The PDF is rasterized to public/UCLA_MAP.png (pdf2image, falling back to
+ImageMagick), then cut into 256px Web Mercator tiles under
+frontend/static/tiles/{z}/{x}/{y}.png, georeferenced against the campus bounds
+in frontend/map_view.py. Zoom levels go from --min-zoom down to the level
+matching the image's own resolution. Columns of tiles are rendered in parallel
+across cores.
+
+A manifest.json next to the tiles records content hashes of the PDF, the PNG,
+and every tile. Unchanged inputs skip rasterizing and tiling altogether, and a
+regenerated tile is only rewritten when its bytes differ.
+
+Usage:
+    python scripts/convert_map.py [--dpi 200] [--min-zoom 14] [--max-zoom N]
+                                  [--bounds S,W,N,E] [--workers N] [--force]
 """
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import subprocess
 import sys
-from pathlib import Path
-
-# Checking if source PDF exists
-pdf_path = Path('public/UCLA_MAP.png')
-pdf_source = Path('public/UCLA_MAP.pdf')
-
-if not pdf_source.exists():
-    print(f"Source PDF not found: {pdf_source}")
-    sys.exit(0)
-
-# Attempting conversion using pdf2image
-try:
-    from pdf2image import convert_from_path
-    print("Converting PDF to PNG using pdf2image...")
-    images = convert_from_path(str(pdf_source), dpi=200)
-    if images:
-        images[0].save(str(pdf_path), 'PNG')
-        print(f"WROTE: {pdf_path}")
-        sys.exit(0)
-    else:
-        raise Exception("No images extracted from PDF")
-except ImportError:
-    # Falling back to ImageMagick convert
-    print("pdf2image not available, trying ImageMagick convert...")
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Allow importing frontend/ from scripts/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from frontend.map_view import CAMPUS_BOUNDS, TILES_DIR
+
+PDF_PATH = "public/UCLA_MAP.pdf"
+PNG_PATH = "public/UCLA_MAP.png"
+TILE_SIZE = 256
+# Bumped when tile rendering changes, so existing pyramids are rebuilt
+TILE_FORMAT = 1
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# Converting the first PDF page to PNG; returns True on success
+def rasterize(pdf_path, png_path, dpi):
     try:
-        import subprocess
-        result = subprocess.run(
-            ['convert', f'{pdf_source}[0]', str(pdf_path)],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        print(f"WROTE: {pdf_path}")
-        sys.exit(0)
-    except (subprocess.CalledProcessError, FileNotFoundError) as e:
-        print("CONVERSION_FAILED — please provide public/UCLA_MAP.png manually")
-        sys.exit(1)
-except Exception as e:
-    # Retrying with ImageMagick as fallback
-    print(f"pdf2image conversion failed: {e}")
-    print("Trying ImageMagick convert as fallback...")
+        from pdf2image import convert_from_path
+
+        print("Converting PDF to PNG using pdf2image...")
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=1, last_page=1)
+        if images:
+            images[0].save(png_path, "PNG")
+            return True
+        print("pdf2image extracted no pages")
+    except ImportError:
+        print("pdf2image not available, trying ImageMagick convert...")
+    except Exception as e:
+        print(f"pdf2image conversion failed: {e}")
+        print("Trying ImageMagick convert as fallback...")
     try:
-        import subprocess
-        result = subprocess.run(
-            ['convert', f'{pdf_source}[0]', str(pdf_path)],
+        subprocess.run(
+            ["convert", "-density", str(dpi), f"{pdf_path}[0]", png_path],
             capture_output=True,
             text=True,
-            check=True
+            check=True,
         )
-        print(f"WROTE: {pdf_path}")
-        sys.exit(0)
-    except (subprocess.CalledProcessError, FileNotFoundError) as e:
-        print("CONVERSION_FAILED — please provide public/UCLA_MAP.png manually")
+        return True
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return False
+
+
+# Web Mercator global pixel coordinates of (lon, lat) at a zoom level
+def lonlat_to_pixel(lon, lat, zoom):
+    scale = TILE_SIZE * 2 ** zoom
+    s = math.sin(math.radians(lat))
+    return (lon + 180) / 360 * scale, (0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)) * scale
+
+
+# Pixel extent (left, top, right, bottom) of the bounds at a zoom level
+def extent(bounds, zoom):
+    south, west, north, east = bounds
+    left, top = lonlat_to_pixel(west, north, zoom)
+    right, bottom = lonlat_to_pixel(east, south, zoom)
+    return left, top, right, bottom
+
+
+# Deepest zoom that does not upscale the source image
+def native_zoom(bounds, width):
+    left, _, right, _ = extent(bounds, 0)
+    return max(0, math.ceil(math.log2(width / (right - left))))
+
+
+def tile_range(bounds, zoom):
+    left, top, right, bottom = extent(bounds, zoom)
+    xs = range(int(left // TILE_SIZE), int(math.ceil(right / TILE_SIZE)))
+    ys = range(int(top // TILE_SIZE), int(math.ceil(bottom / TILE_SIZE)))
+    return xs, ys
+
+
+_worker = {}
+
+
+def _init_worker(png_path, bounds, out_dir, old_tiles):
+    from PIL import Image
+
+    image = Image.open(png_path).convert("RGBA")
+    image.load()
+    _worker.update(image=image, bounds=bounds, out_dir=out_dir, old_tiles=old_tiles)
+
+
+def render_tile(zoom, x, y):
+    from PIL import Image
+
+    image = _worker["image"]
+    width, height = image.size
+    left, top, right, bottom = extent(_worker["bounds"], zoom)
+    sx, sy = width / (right - left), height / (bottom - top)
+
+    # The tile's box in source pixels, clipped to the image
+    box_left, box_top = (x * TILE_SIZE - left) * sx, (y * TILE_SIZE - top) * sy
+    box_right, box_bottom = box_left + TILE_SIZE * sx, box_top + TILE_SIZE * sy
+    crop = (max(box_left, 0), max(box_top, 0), min(box_right, width), min(box_bottom, height))
+
+    tile = Image.new("RGBA", (TILE_SIZE, TILE_SIZE), (0, 0, 0, 0))
+    dest = (
+        round((crop[0] - box_left) / sx), round((crop[1] - box_top) / sy),
+        round((crop[2] - box_left) / sx), round((crop[3] - box_top) / sy),
+    )
+    if dest[2] > dest[0] and dest[3] > dest[1]:
+        part = image.resize((dest[2] - dest[0], dest[3] - dest[1]), Image.Resampling.LANCZOS, box=crop)
+        tile.paste(part, dest[:2])
+    return tile
+
+
+# Rendering one column of tiles; returns [(key, sha, written)]
+def render_column(zoom, x, ys):
+    import io
+
+    results = []
+    for y in ys:
+        buf = io.BytesIO()
+        render_tile(zoom, x, y).save(buf, "PNG", optimize=True)
+        data = buf.getvalue()
+        key = f"{zoom}/{x}/{y}"
+        sha = hashlib.sha256(data).hexdigest()[:16]
+        path = os.path.join(_worker["out_dir"], f"{key}.png")
+        if _worker["old_tiles"].get(key) == sha and os.path.exists(path):
+            results.append((key, sha, False))
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Writing beside the tile and renaming, so the app never serves a half-written file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        results.append((key, sha, True))
+    return results
+
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, "manifest.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def build_pyramid(png_path, out_dir, bounds, min_zoom, max_zoom, workers, old):
+    old_tiles = old.get("tiles", {})
+    jobs = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        xs, ys = tile_range(bounds, zoom)
+        jobs.extend((zoom, x, list(ys)) for x in xs)
+
+    tiles, written = {}, 0
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(png_path, bounds, out_dir, old_tiles)
+    ) as pool:
+        futures = [pool.submit(render_column, *job) for job in jobs]
+        for future in futures:
+            for key, sha, wrote in future.result():
+                tiles[key] = sha
+                written += wrote
+
+    # Dropping tiles from the previous pyramid that are no longer part of it
+    for key in set(old_tiles) - set(tiles):
+        path = os.path.join(out_dir, f"{key}.png")
+        if os.path.exists(path):
+            os.remove(path)
+    for zoom in set(int(k.split("/")[0]) for k in old_tiles) - set(range(min_zoom, max_zoom + 1)):
+        shutil.rmtree(os.path.join(out_dir, str(zoom)), ignore_errors=True)
+    return tiles, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rasterize the campus map and cut it into a z/x/y tile pyramid.")
+    parser.add_argument("--pdf", default=PDF_PATH, help="source PDF")
+    parser.add_argument("--png", default=PNG_PATH, help="rasterized map image (tiled when the PDF is missing)")
+    parser.add_argument("--out", default=TILES_DIR, help="tile directory")
+    parser.add_argument("--dpi", type=int, default=200, help="rasterization DPI")
+    parser.add_argument("--min-zoom", type=int, default=14)
+    parser.add_argument("--max-zoom", type=int, help="deepest zoom (default: native resolution of the image)")
+    parser.add_argument("--bounds", help="S,W,N,E edges of the map (default: frontend/map_view.py CAMPUS_BOUNDS)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="tile rendering processes")
+    parser.add_argument("--force", action="store_true", help="rebuild even if inputs are unchanged")
+    args = parser.parse_args()
+
+    bounds = tuple(float(v) for v in args.bounds.split(",")) if args.bounds else CAMPUS_BOUNDS
+    old = {} if args.force else load_manifest(args.out)
+
+    # Rasterizing only when the PDF changed since the last run (or no PNG exists yet)
+    pdf_sha = file_sha256(args.pdf) if os.path.exists(args.pdf) else None
+    rasterized_from = old.get("pdf_sha256")
+    if pdf_sha and (pdf_sha != rasterized_from or not os.path.exists(args.png)):
+        if rasterize(args.pdf, args.png, args.dpi):
+            rasterized_from = pdf_sha
+            print(f"WROTE: {args.png}")
+        elif os.path.exists(args.png):
+            print(f"CONVERSION_FAILED — tiling the existing {args.png}")
+        else:
+            print(f"CONVERSION_FAILED — please provide {args.png} manually")
+            sys.exit(1)
+    elif not os.path.exists(args.png):
+        print(f"Source not found: {args.pdf} / {args.png}")
         sys.exit(1)
+
+    from PIL import Image
+
+    with Image.open(args.png) as image:
+        width = image.size[0]
+    max_zoom = args.max_zoom if args.max_zoom is not None else max(args.min_zoom, native_zoom(bounds, width))
+
+    png_sha = file_sha256(args.png)
+    params = {"bounds": list(bounds), "min_zoom": args.min_zoom, "max_zoom": max_zoom,
+              "tile_size": TILE_SIZE, "format": TILE_FORMAT}
+    key = hashlib.sha256(json.dumps([png_sha, params], sort_keys=True).encode()).hexdigest()[:16]
+    if old.get("key") == key and all(
+        os.path.exists(os.path.join(args.out, f"{t}.png")) for t in old.get("tiles", {})
+    ):
+        print(f"UNCHANGED: {args.out} (zoom {args.min_zoom}-{max_zoom}, {len(old['tiles'])} tiles)")
+        return
+
+    start = time.perf_counter()
+    os.makedirs(args.out, exist_ok=True)
+    tiles, written = build_pyramid(args.png, args.out, bounds, args.min_zoom, max_zoom, args.workers, old)
+    manifest = dict(params, key=key, pdf_sha256=rasterized_from, png_sha256=png_sha, tiles=dict(sorted(tiles.items())))
+    with open(os.path.join(args.out, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+    print(
+        f"WROTE: {args.out} (zoom {args.min_zoom}-{max_zoom}, {len(tiles)} tiles, "
+        f"{written} changed) in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: checking import cost of the modules the app loads before first paint.
+
+Each module is imported in a fresh interpreter with `python -X importtime`.
+The best cumulative time over a few runs is compared against its budget, and
+heavy dependencies that should stay deferred (sklearn, pandas, supabase,
+folium, ...) must not show up at all.
+
+Usage:
+    python scripts/import_budget.py [--runs 3] [--scale 1.0]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Cumulative import time budgets in milliseconds
+BUDGETS_MS = {
+    "backend.supabase_client": 30,
+    "backend.events": 50,
+    "backend.subscribers": 50,
+    "model.predictor": 250,
+}
+
+# Modules that must only be imported on first use
+DEFERRED = {
+    "backend.supabase_client": ["supabase", "httpx", "dotenv", "streamlit"],
+    "backend.events": ["supabase", "httpx", "dotenv", "streamlit"],
+    "backend.subscribers": ["supabase", "httpx", "dotenv", "streamlit"],
+    "model.predictor": ["sklearn", "pandas", "joblib"],
+}
+
+
+# Parsing `-X importtime` output into {module: cumulative_us}
+def measure(module):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import-time budgets for app modules.")
+    parser.add_argument("--runs", type=int, default=3, help="imports per module (best run is kept)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply budgets (e.g. for slow CI machines)")
+    args = parser.parse_args()
+
+    failures = []
+    for module, budget in BUDGETS_MS.items():
+        runs = [measure(module) for _ in range(args.runs)]
+        best = min(r[module] for r in runs) / 1000
+        limit = budget * args.scale
+        leaked = [dep for dep in DEFERRED.get(module, []) if dep in runs[0]]
+
+        status = "OK" if best <= limit and not leaked else "FAIL"
+        print(f"{status:4} {module:28} {best:8.1f} ms (budget {limit:.0f} ms)")
+        if leaked:
+            print(f"     eagerly imports: {', '.join(leaked)}")
+        if status == "FAIL":
+            failures.append(module)
+
+    if failures:
+        print(f"\nImport budget exceeded: {', '.join(failures)}")
+        sys.exit(1)
+    print("\nAll import budgets met.")
+
+
+if __name__ == "__main__":
+    main()
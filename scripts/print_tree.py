@@ -1,6 +1,35 @@
 import json
+import sys
 
-with open("model/tree.json") as f:
+path = sys.argv[1] if len(sys.argv) > 1 else "model/predictor_tree.json"
+
+with open(path) as f:
     data = json.load(f)
 
-print(data["tree"])
+if "nodes" not in data:
+    # Legacy exports (model/tree.json) only carry sklearn's text rendering
+    print(data["tree"])
+    sys.exit()
+
+nodes = data["nodes"]
+print(f"FoodLens tree {data.get('version')} ({len(nodes['left'])} nodes)")
+
+
+# Printing the structured nodes depth-first, one split or leaf per line
+def show(node, depth):
+    pad = "|   " * depth
+    if nodes["left"][node] == -1:
+        print(f"{pad}|--- value: {nodes['value'][node]:.2f} (samples: {nodes['samples'][node]})")
+        return
+    col, cat, thr = nodes["column"][node], nodes["category"][node], nodes["threshold"][node]
+    if cat is not None:
+        left, right = f"{col} != {cat}", f"{col} == {cat}"
+    else:
+        left, right = f"{col} <= {thr:.2f}", f"{col} >  {thr:.2f}"
+    print(f"{pad}|--- {left}")
+    show(nodes["left"][node], depth + 1)
+    print(f"{pad}|--- {right}")
+    show(nodes["right"][node], depth + 1)
+
+
+show(0, 0)
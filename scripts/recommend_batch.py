@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Streaming a CSV of planned events through the batch predictor.
+
+Usage:
+    python scripts/recommend_batch.py planned.csv [-o recommendations.csv] [--chunksize 5000]
+
+The input needs building, zone, event_type, day, time, rsvps and planned_food
+columns. Output keeps the input columns and appends predicted_attendance,
+recommended_food and reduction (plus explanation with --explain).
+"""
+import argparse
+import os
+import sys
+
+# Allow importing model/ from scripts/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+
+from model.predictor import recommend_many
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch food recommendations for planned events.")
+    parser.add_argument("input", help="CSV of planned events")
+    parser.add_argument("-o", "--output", help="output CSV (default: stdout)")
+    parser.add_argument("--chunksize", type=int, default=5000, help="rows per predict call")
+    parser.add_argument("--explain", action="store_true", help="include explanation text")
+    args = parser.parse_args()
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    rows = 0
+    try:
+        # Processing the file chunk by chunk so memory stays flat
+        for i, chunk in enumerate(pd.read_csv(args.input, chunksize=args.chunksize)):
+            batch = recommend_many(chunk)
+            result = pd.concat([chunk.reset_index(drop=True), batch.to_frame()], axis=1)
+            if args.explain:
+                result["explanation"] = [" ".join(lines) for lines in batch.explanations()]
+            result.to_csv(out, header=(i == 0), index=False)
+            rows += len(result)
+    finally:
+        if args.output:
+            out.close()
+
+    if args.output:
+        print(f"WROTE: {args.output} ({rows} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,21 @@
 import os
+import sys
 import pandas as pd
 
+# Allow importing model/ and backend/ from tests/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Running against the in-process SQLite backend unless told otherwise
+os.environ.setdefault("FOODLENS_BACKEND", "memory")
+os.environ.setdefault("FOODLENS_NOTIFY_TRANSPORT", "none")
+
 def check_file_exists(path):
     if not os.path.exists(path):
         raise AssertionError(f"Missing required file: {path}")
     print(f"✔ Found: {path}")
 
 def check_dataset():
-    df = pd.read_csv("model/data.csv")
+    df = pd.read_csv("model/dataset.csv")
     if len(df) < 10:
         raise AssertionError("Dataset has fewer than 10 rows.")
     print(f"✔ Dataset OK ({len(df)} rows)")
@@ -18,6 +26,60 @@ def check_model_export():
         raise AssertionError("tree.json is empty or unreadable.")
     print("✔ Model export OK (tree.json)")
 
+def check_tree_engine():
+    import numpy as np
+    from model.predictor import FEATURES, load_predictor
+    from model.tree_engine import load_engine
+
+    df = pd.read_csv("model/past_events.csv")
+    expected = load_predictor().predict(df[FEATURES])
+    actual = load_engine().predict(df)
+    if not np.array_equal(expected, actual):
+        raise AssertionError("predictor_tree.npz disagrees with the sklearn pipeline.")
+    print("✔ Tree engine matches sklearn pipeline")
+
+def check_search():
+    from model.train_model import search
+
+    df = pd.read_csv("model/past_events.csv")
+    results = search(df, depths=[3, 5], min_leaf=[1, 5], buffers=[0, 15], n_folds=3, workers=1)
+    best = results[0]
+    if best["cv_mae"] != min(r["cv_mae"] for r in results):
+        raise AssertionError("Search did not pick the tree with the lowest CV MAE.")
+    if best["food_buffer"] != min(best["buffer_costs"], key=best["buffer_costs"].get):
+        raise AssertionError("Search did not pick the cheapest food buffer for the chosen tree.")
+    print(f"✔ Search OK (depth={best['max_depth']} min_leaf={best['min_samples_leaf']} "
+          f"cv_mae={best['cv_mae']:.2f} food_buffer={best['food_buffer']})")
+
+def check_local_backend():
+    from backend.events import add_event, deactivate_event, fetch_events
+    from backend.subscribers import add_subscriber
+
+    add_event({"building": "Gonda", "zone": "north", "event_type": "club", "diet": "vegan",
+               "food_desc": "pizza", "collect_mode": "Until supplies last", "collect_until_time": "",
+               "image_url": None, "is_active": True})
+    active = fetch_events(active=True, zones=["north"], diets=["vegan"])
+    if not active:
+        raise AssertionError("Added event was not returned by fetch_events().")
+    deactivate_event(active[0]["id"], "smoke test")
+    if any(e["id"] == active[0]["id"] for e in fetch_events(active=True)):
+        raise AssertionError("Closed event is still listed as active.")
+    add_subscriber("smoke", "smoke@example.com", ["north"], ["vegan"])
+    print(f"✔ Events/subscribers API OK ({os.environ['FOODLENS_BACKEND']} backend)")
+
+def check_tracing():
+    from backend.events import fetch_events
+    from backend.tracing import begin_rerun, end_rerun, prometheus_text
+
+    begin_rerun("smoke")
+    fetch_events(active=True)
+    rerun = end_rerun()
+    if "events.fetch_events" not in rerun["spans"]:
+        raise AssertionError("fetch_events() was not traced in the rerun.")
+    if "foodlens_span_seconds_count" not in prometheus_text():
+        raise AssertionError("Prometheus export has no span histograms.")
+    print(f"✔ Tracing OK ({rerun['io_ms']:.1f} ms I/O, {rerun['compute_ms']:.1f} ms compute)")
+
 def check_frontend():
     check_file_exists("frontend/app.py")
 
@@ -34,6 +96,10 @@ def run_all():
     check_file_exists("model/predictor.py")
     check_dataset()
     check_model_export()
+    check_tree_engine()
+    check_search()
+    check_local_backend()
+    check_tracing()
     check_frontend()
     check_images_folder()
     print("\nALL SMOKE TESTS PASSED ✔\n")